@@ -1,8 +1,23 @@
+import base64
+import hashlib
 import os
 import random
+from itertools import groupby
+import sys
+import threading
+import time
 from datetime import datetime, date, timedelta, timezone
 from functools import wraps
-from flask import Flask, jsonify, request, send_file, after_this_request
+from flask import (
+    Flask,
+    Response,
+    g,
+    has_request_context,
+    jsonify,
+    request,
+    send_file,
+    stream_with_context,
+)
 from flask_cors import CORS
 from sqlalchemy import (
     create_engine,
@@ -13,26 +28,118 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     func,
+    and_,
+    or_,
     text,
     inspect,
     Boolean,
+    Index,
+    insert,
+    select,
+    update,
+    event,
 )
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship, joinedload
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base, relationship, joinedload
+from sqlalchemy.exc import IntegrityError, OperationalError
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import generate_password_hash
 import jwt
 
-from pdf_utils import build_invoice_pdf
-from export_utils import export_transactions_csv, export_inventory_csv
+from export_utils import (
+    COIN_LEDGER_COLUMNS,
+    TRANSACTION_LEDGER_COLUMNS,
+    arrow_available,
+    coins_ledger_select,
+    export_inventory_csv,
+    export_ledger_arrow,
+    export_ledger_ndjson,
+    export_transactions_csv,
+    last_ledger_id,
+    ledger_filters,
+    transactions_ledger_select,
+)
+from cache_utils import LRUCache
+from invoice_jobs import cached_invoice_pdf, get_invoice_job, invoice_cache, start_invoice_job
+from nfc_reader import ReaderManager
+from security_utils import (
+    PASSWORD_HASH_METHOD,
+    HashingBusy,
+    LoginThrottle,
+    hash_password,
+    needs_rehash,
+    verify_password,
+)
 
 load_dotenv()
 
 JWT_SECRET = os.getenv("JWT_SECRET", "choose_a_long_random_secret")
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+LOGIN_THROTTLE_WINDOW_SECONDS = float(os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", "300"))
+# Number of reverse proxies (e.g. nginx) in front of the app whose
+# X-Forwarded-For may be trusted for the client IP.
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+# Create/upgrade the schema when the server starts (create_app). Set to 0 when
+# the deploy runs `python app.py bootstrap` itself.
+AUTO_BOOTSTRAP = os.getenv("AUTO_BOOTSTRAP", "1").lower() not in {"0", "false", "no"}
 NFC_MODE = os.getenv("NFC_MODE", "auto").lower()
 NFC_BRIDGE_TOKEN = os.getenv("NFC_BRIDGE_TOKEN")
 NFC_BRIDGE_MAX_AGE_SECONDS = int(os.getenv("NFC_BRIDGE_MAX_AGE_SECONDS", "30"))
 NFC_BRIDGE_SOURCE = os.getenv("NFC_BRIDGE_SOURCE", "bridge")
+# Simulated codes only come from a single server process: with several workers
+# only one can open a USB reader, and the others must not hand random codes to
+# a till instead.
+NFC_SIMULATION = int(os.getenv("WEB_WORKERS", "1")) <= 1
+NFC_READ_MAX_WAIT_SECONDS = float(os.getenv("NFC_READ_MAX_WAIT_SECONDS", "25"))
+# WEB_WORKERS is set by gunicorn.conf.py; one process needs no re-checks.
+# With several, one watcher per process polls MAX(nfc_scans.id) this often
+# while reads are waiting, for scans pushed to another worker.
+NFC_READ_RECHECK_SECONDS = float(
+    os.getenv("NFC_READ_RECHECK_SECONDS", "1" if int(os.getenv("WEB_WORKERS", "1")) > 1 else "0")
+)
+# Waiting reads each hold a request thread; beyond this many per process a
+# read is refused with 503 so writes keep free threads (default: half).
+NFC_READ_MAX_WAITERS = int(
+    os.getenv("NFC_READ_MAX_WAITERS", str(max(1, int(os.getenv("WEB_THREADS", "8")) // 2)))
+)
+NFC_PUSH_BATCH_MAX = int(os.getenv("NFC_PUSH_BATCH_MAX", "100"))
+NFC_SCAN_RETENTION_HOURS = float(os.getenv("NFC_SCAN_RETENTION_HOURS", "24"))
+NFC_PURGE_BATCH_SIZE = int(os.getenv("NFC_PURGE_BATCH_SIZE", "1000"))
+# Seconds between automatic purges in each server process; 0 turns them off.
+NFC_PURGE_INTERVAL_SECONDS = float(os.getenv("NFC_PURGE_INTERVAL_SECONDS", "3600"))
+CUSTOMER_CACHE_SIZE = int(os.getenv("CUSTOMER_CACHE_SIZE", "2048"))
+CUSTOMER_CACHE_TTL_SECONDS = float(os.getenv("CUSTOMER_CACHE_TTL_SECONDS", "300"))
+TRANSACTION_BATCH_MAX_LINES = int(os.getenv("TRANSACTION_BATCH_MAX_LINES", "200"))
+TRANSACTION_PAGE_SIZE = int(os.getenv("TRANSACTION_PAGE_SIZE", "50"))
+TRANSACTION_PAGE_MAX = int(os.getenv("TRANSACTION_PAGE_MAX", "500"))
+# Ledger exports leave out rows younger than this, so a slow commit with a
+# lower id cannot slip below the X-Export-Last-Id a sync has already seen.
+EXPORT_SETTLE_SECONDS = float(os.getenv("EXPORT_SETTLE_SECONDS", "10"))
+DB_RETRY_ATTEMPTS = max(1, int(os.getenv("DB_RETRY_ATTEMPTS", "5")))
+DB_RETRY_BACKOFF_SECONDS = float(os.getenv("DB_RETRY_BACKOFF_SECONDS", "0.02"))
+# SQLite profile, applied to every new connection (SQLITE_TUNING=0 = driver defaults).
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "1").lower() not in {"0", "false", "no"}
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "128"))
+# MySQL connection pool per server process.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Below MySQL's wait_timeout so idle pooled connections are never dropped server-side.
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# Requests slower than this (ms) are logged with their query count; 0 = off.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "1").lower() not in {"0", "false", "no"}
 
 DATABASE_URI = os.getenv("DATABASE_URL")
 if not DATABASE_URI:
@@ -57,13 +164,100 @@ if DATABASE_URI.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URI, connect_args={"check_same_thread": False}
     )
+    if SQLITE_TUNING:
+        SQLITE_PRAGMAS = [
+            f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+            f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+            f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+            f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+            f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        ]
+
+        @event.listens_for(engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, _connection_record):
+            # WAL lets the tills read while one of them writes, busy_timeout
+            # makes writers queue instead of failing with "database is
+            # locked", and synchronous=NORMAL skips the fsync per commit (a
+            # power cut can lose the last commits, never corrupt the file).
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in SQLITE_PRAGMAS:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
 else:
-    engine = create_engine(DATABASE_URI, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine = create_engine(
+        DATABASE_URI,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    )
+# One session per thread, i.e. per request under the threaded servers: routes
+# and the helpers they call share it, and teardown removes it after the
+# response. Background threads get their own.
+SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 Base = declarative_base()
 
+# identifier (klantnummer of NFC-code) -> (customer id, "customers" data
+# version it was read at). Entries from an older version are ignored, so edits
+# made through any worker process take effect on the next lookup.
+customer_id_cache = LRUCache(CUSTOMER_CACHE_SIZE, ttl=CUSTOMER_CACHE_TTL_SECONDS)
+# Verified JWT -> (claims, allowed dashboards); entries never outlive "exp".
+token_claims_cache = LRUCache(AUTH_CACHE_SIZE)
+# ETag -> (body, mimetype) for the @versioned read endpoints.
+response_body_cache = LRUCache(RESPONSE_CACHE_SIZE)
+login_throttle = LoginThrottle(
+    LOGIN_MAX_FAILURES_PER_USER, LOGIN_MAX_FAILURES_PER_IP, LOGIN_THROTTLE_WINDOW_SECONDS
+)
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Content-Disposition", "X-Export-Last-Id", "Server-Timing"])
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+
+# ---------- REQUEST SESSION & TIMING ----------
+@event.listens_for(engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info["statement_started"] = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_seconds = g.get("db_seconds", 0.0) + time.perf_counter() - conn.info["statement_started"]
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _report_request_timing(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    total_ms = (time.perf_counter() - started) * 1000
+    queries = g.get("db_queries", 0)
+    db_ms = g.get("db_seconds", 0.0) * 1000
+    if SERVER_TIMING_HEADER:
+        response.headers.add("Server-Timing", f'db;dur={db_ms:.1f};desc="{queries} queries"')
+        response.headers.add("Server-Timing", f"app;dur={total_ms:.1f}")
+    if SLOW_REQUEST_MS and total_ms >= SLOW_REQUEST_MS and not g.get("long_poll"):
+        app.logger.warning(
+            "Trage request %s %s (%s): %.0f ms, %d queries, %.0f ms database",
+            request.method, request.path, response.status_code, total_ms, queries, db_ms,
+        )
+    return response
+
+
+@app.teardown_appcontext
+def _remove_session(_exc):
+    SessionLocal.remove()
 
 # ---------- MODELS ----------
 AVAILABLE_DASHBOARDS = [
@@ -78,6 +272,7 @@ AVAILABLE_DASHBOARDS = [
     "accounts",
     "instellingen",
 ]
+ALL_DASHBOARDS = frozenset(AVAILABLE_DASHBOARDS)
 
 
 class User(Base):
@@ -120,6 +315,10 @@ class Transaction(Base):
     tx_type = Column(Enum("issue", "return", name="tx_type"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     customer = relationship("Customer", back_populates="transactions")
+    __table_args__ = (
+        Index("ix_transactions_customer_created", "customer_id", "created_at"),
+        Index("ix_transactions_created", "created_at"),
+    )
 
 
 class CoinTransaction(Base):
@@ -130,6 +329,7 @@ class CoinTransaction(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     recorded_by = Column(String(64), nullable=True)
     customer = relationship("Customer")
+    __table_args__ = (Index("ix_coin_transactions_created", "created_at"),)
 
 
 class NfcScan(Base):
@@ -140,8 +340,38 @@ class NfcScan(Base):
     consumed = Column(Boolean, default=False, nullable=False)
     consumed_at = Column(DateTime, nullable=True)
     source = Column(String(64), nullable=True)
+    __table_args__ = (
+        Index("ix_nfc_scans_consumed_created", "consumed", "created_at"),
+        Index("ix_nfc_scans_source_consumed_created", "source", "consumed", "created_at"),
+    )
+
+
+# Rollups maintained by create_transaction/coins_intake so summaries do not
+# have to aggregate the full ledgers. Rebuild with `python app.py rebuild-totals`.
+class CustomerTotal(Base):
+    __tablename__ = "customer_totals"
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    product_key = Column(String(32), primary_key=True)
+    tx_type = Column(Enum("issue", "return", name="tx_type"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class CustomerCoinTotal(Base):
+    __tablename__ = "customer_coin_totals"
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+
+# Change counters per data area, bumped in the same DB transaction as every
+# write so all workers agree on ETags for the read endpoints.
+DATA_SCOPES = ("customers", "inventory", "totals")
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    scope = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
-Base.metadata.create_all(bind=engine)
 
 # Seed data
 def seed_initial():
@@ -160,7 +390,7 @@ def seed_initial():
             s.add(
                 User(
                     username="Tebbensj",
-                    password_hash=generate_password_hash("Proefmei2026!"),
+                    password_hash=generate_password_hash("Proefmei2026!", PASSWORD_HASH_METHOD),
                     role="admin",
                     allowed_dashboards="*",
                 )
@@ -168,7 +398,6 @@ def seed_initial():
         s.commit()
     finally:
         s.close()
-seed_initial()
 
 
 def ensure_schema():
@@ -182,9 +411,232 @@ def ensure_schema():
                 "UPDATE users SET allowed_dashboards='*' WHERE role='admin' AND (allowed_dashboards IS NULL OR allowed_dashboards='dashboard')"
             )
         )
+    # create_all() only adds indexes together with new tables; add missing
+    # ones to tables that already existed (no-op when present).
+    for table in (Transaction.__table__, CoinTransaction.__table__, NfcScan.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    backfill_customer_totals()
+    with SessionLocal() as s:
+        present = {scope for (scope,) in s.query(DataVersion.scope)}
+        s.add_all(DataVersion(scope=scope, version=0) for scope in DATA_SCOPES if scope not in present)
+        s.commit()
+
+
+# ---------- ROLLUPS ----------
+def _increment_total(s, model, keys, amount):
+    """Add ``amount`` to the rollup row identified by ``keys`` (upsert)."""
+    values = dict(keys, total=amount)
+    dialect = s.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite_insert(model).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys), set_={"total": model.total + stmt.excluded.total}
+        )
+    elif dialect == "mysql":
+        stmt = mysql_insert(model).values(**values)
+        stmt = stmt.on_duplicate_key_update(total=model.total + stmt.inserted.total)
+    else:
+        updated = (
+            s.query(model)
+            .filter_by(**keys)
+            .update({model.total: model.total + amount}, synchronize_session=False)
+        )
+        if updated:
+            return
+        stmt = insert(model).values(**values)
+    s.execute(stmt)
+
+
+def bump_data_version(s, *scopes):
+    """Invalidate cached responses that depend on ``scopes`` once ``s`` commits.
+
+    Pending ORM changes are flushed first, so every writer locks its own rows
+    (inventory, customers, totals) before the data_versions rows; the reverse
+    order against a concurrent transaction can deadlock on MySQL.
+    """
+    s.flush()
+    for scope in sorted(set(scopes)):  # fixed lock order across writers
+        updated = s.execute(
+            update(DataVersion).where(DataVersion.scope == scope).values(version=DataVersion.version + 1)
+        ).rowcount
+        if not updated:
+            s.add(DataVersion(scope=scope, version=1))
+
+
+def bump_data_version_after_commit(*scopes):
+    """Bump ``scopes`` in a short transaction of its own, after a writer committed.
+
+    For the till write paths: holding the shared data_versions rows until the
+    booking commits would queue every till behind them. Bumping afterwards is
+    safe for the ETags, since a read in between can only cache the new data
+    under the old version, which this bump retires. A failed bump is logged
+    rather than reported, because the booking itself already committed.
+    """
+    s = SessionLocal.session_factory()
+    try:
+        def work():
+            bump_data_version(s, *scopes)
+            s.commit()
+
+        run_with_retry(s, work)
+    except OperationalError as exc:
+        app.logger.warning("Dataversies %s ophogen mislukt: %s", ", ".join(scopes), exc)
+    finally:
+        s.close()
+
+
+def current_data_version(s, scope):
+    return s.query(DataVersion.version).filter(DataVersion.scope == scope).scalar() or 0
+
+
+def record_transaction_total(s, customer_id, product_key, tx_type, amount):
+    _increment_total(
+        s,
+        CustomerTotal,
+        {"customer_id": customer_id, "product_key": product_key, "tx_type": tx_type},
+        amount,
+    )
+
+
+def record_coin_total(s, customer_id, amount):
+    _increment_total(s, CustomerCoinTotal, {"customer_id": customer_id}, amount)
+
+
+def _ledger_transaction_totals():
+    return (
+        select(
+            Transaction.customer_id,
+            Transaction.product_key,
+            Transaction.tx_type,
+            func.sum(Transaction.amount).label("total"),
+        )
+        .group_by(Transaction.customer_id, Transaction.product_key, Transaction.tx_type)
+    )
+
+
+def _ledger_coin_totals():
+    return (
+        select(CoinTransaction.customer_id, func.sum(CoinTransaction.amount).label("total"))
+        .group_by(CoinTransaction.customer_id)
+    )
+
+
+def rebuild_customer_totals(s):
+    """Recompute both rollup tables from the ledgers (caller commits)."""
+    s.query(CustomerTotal).delete(synchronize_session=False)
+    s.query(CustomerCoinTotal).delete(synchronize_session=False)
+    s.execute(
+        insert(CustomerTotal).from_select(
+            ["customer_id", "product_key", "tx_type", "total"], _ledger_transaction_totals()
+        )
+    )
+    s.execute(
+        insert(CustomerCoinTotal).from_select(["customer_id", "total"], _ledger_coin_totals())
+    )
+
+
+def verify_customer_totals(s):
+    """Return a list of rollup rows that differ from the ledgers."""
+    expected = {
+        (r.customer_id, r.product_key, r.tx_type): int(r.total)
+        for r in s.execute(_ledger_transaction_totals())
+    }
+    actual = {
+        (r.customer_id, r.product_key, r.tx_type): int(r.total)
+        for r in s.query(CustomerTotal)
+        if r.total
+    }
+    drift = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        if expected.get(key, 0) != actual.get(key, 0):
+            drift.append(
+                {
+                    "customer_id": key[0],
+                    "product_key": key[1],
+                    "tx_type": key[2],
+                    "expected": expected.get(key, 0),
+                    "actual": actual.get(key, 0),
+                }
+            )
+    expected_coins = {r.customer_id: int(r.total) for r in s.execute(_ledger_coin_totals())}
+    actual_coins = {r.customer_id: int(r.total) for r in s.query(CustomerCoinTotal) if r.total}
+    for cid in sorted(set(expected_coins) | set(actual_coins)):
+        if expected_coins.get(cid, 0) != actual_coins.get(cid, 0):
+            drift.append(
+                {
+                    "customer_id": cid,
+                    "product_key": "coins",
+                    "tx_type": None,
+                    "expected": expected_coins.get(cid, 0),
+                    "actual": actual_coins.get(cid, 0),
+                }
+            )
+    return drift
+
+
+def backfill_customer_totals():
+    """Fill empty rollups once for databases that predate them."""
+    s = SessionLocal()
+    try:
+        rollups_empty = (
+            s.query(CustomerTotal.customer_id).first() is None
+            and s.query(CustomerCoinTotal.customer_id).first() is None
+        )
+        ledger_filled = (
+            s.query(Transaction.id).first() is not None
+            or s.query(CoinTransaction.id).first() is not None
+        )
+        if rollups_empty and ledger_filled:
+            rebuild_customer_totals(s)
+            bump_data_version(s, "totals")
+            s.commit()
+    finally:
+        s.close()
 
 
-ensure_schema()
+@app.cli.command("rebuild-totals")
+@click.option("--verify", "verify_only", is_flag=True, help="Alleen afwijkingen tonen, niets herbouwen.")
+def rebuild_totals_command(verify_only):
+    """Controleer of herbouw de klanttotalen vanuit transacties en munten."""
+    s = SessionLocal()
+    try:
+        drift = verify_customer_totals(s)
+        for row in drift:
+            click.echo(
+                f"klant {row['customer_id']} {row['product_key']} {row['tx_type'] or ''}: "
+                f"verwacht {row['expected']}, opgeslagen {row['actual']}"
+            )
+        if verify_only:
+            click.echo(f"{len(drift)} afwijking(en) gevonden.")
+            if drift:
+                raise SystemExit(1)
+            return
+        rebuild_customer_totals(s)
+        bump_data_version(s, "totals")
+        s.commit()
+        click.echo(f"Klanttotalen herbouwd ({len(drift)} afwijking(en) hersteld).")
+    finally:
+        s.close()
+
+
+def bootstrap_database():
+    """Create missing tables, seed the initial data and upgrade older schemas.
+
+    Idempotent. Runs once per deploy (``python app.py bootstrap``) or from
+    create_app(), never on import, so workers and CLI commands start without
+    touching the database.
+    """
+    Base.metadata.create_all(bind=engine)
+    seed_initial()
+    ensure_schema()
+
+
+@app.cli.command("bootstrap")
+def bootstrap_command():
+    """Maak tabellen aan, vul startgegevens en werk het schema bij."""
+    bootstrap_database()
+    click.echo("Database is bijgewerkt.")
 
 # ---------- AUTH HELPERS ----------
 def resolve_dashboards(value):
@@ -211,87 +663,176 @@ def dashboards_to_store(dashboards):
     return ",".join(unique) if unique else "dashboard"
 
 
-def has_dashboard_access(claims, dashboards_required):
-    if not dashboards_required:
-        return True
-    allowed = claims.get("dashboards")
-    if not allowed:
-        return False
-    if isinstance(allowed, list):
-        allowed_set = set(allowed)
-    elif allowed == "*":
-        return True
-    else:
-        allowed_set = set(resolve_dashboards(allowed))
-    if "*" in allowed_set:
-        return True
-    if isinstance(dashboards_required, (list, tuple, set)):
-        return bool(set(dashboards_required) & allowed_set)
-    return dashboards_required in allowed_set
+def dashboard_set(value):
+    """Allowed dashboards from a claim or stored value as a frozenset."""
+    if not value:
+        return frozenset()
+    if value == "*" or (isinstance(value, list) and "*" in value):
+        return ALL_DASHBOARDS
+    if isinstance(value, list):
+        return frozenset(value)
+    return frozenset(resolve_dashboards(value))
+
+
+def _required_set(dashboards_required):
+    if isinstance(dashboards_required, (list, tuple, set, frozenset)):
+        return frozenset(dashboards_required)
+    return frozenset([dashboards_required])
+
+
+def verified_claims(token):
+    """Decode ``token`` once and cache (claims, allowed dashboards) until it expires.
+
+    Raises jwt.InvalidTokenError for tokens that fail verification.
+    """
+    entry = token_claims_cache.get(token)
+    if entry is not None:
+        return entry
+    claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+    entry = (claims, dashboard_set(claims.get("dashboards")))
+    ttl = AUTH_CACHE_TTL_SECONDS
+    if "exp" in claims:
+        ttl = min(ttl, claims["exp"] - time.time())
+    if ttl > 0:
+        token_claims_cache.set(token, entry, ttl=ttl)
+    return entry
 
 
 def auth_required(roles=None, dashboards=None):
+    allowed_roles = frozenset(roles or ())
+    required = _required_set(dashboards) if dashboards else frozenset()
+
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            token = None
-            if "Authorization" in request.headers:
-                parts = request.headers["Authorization"].split()
-                if len(parts) == 2 and parts[0].lower() == "bearer":
-                    token = parts[1]
-            if not token:
+            parts = request.headers.get("Authorization", "").split()
+            if len(parts) != 2 or parts[0].lower() != "bearer":
                 return jsonify({"error": "Unauthorized"}), 401
             try:
-                data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-                request.user = data  # {'sub': username, 'role': 'admin', 'dashboards': [...]}
-                if roles and data.get("role") not in roles:
-                    return jsonify({"error": "Forbidden"}), 403
-                if dashboards and not has_dashboard_access(data, dashboards):
-                    return jsonify({"error": "Forbidden"}), 403
-            except Exception:
+                data, allowed = verified_claims(parts[1])
+            except jwt.InvalidTokenError:
                 return jsonify({"error": "Invalid token"}), 401
+            request.user = data  # {'sub': username, 'role': 'admin', 'dashboards': [...]}
+            if allowed_roles and data.get("role") not in allowed_roles:
+                return jsonify({"error": "Forbidden"}), 403
+            if required and required.isdisjoint(allowed):
+                return jsonify({"error": "Forbidden"}), 403
             return fn(*args, **kwargs)
         return wrapper
     return decorator
 
+
+def versioned(*scopes, per_user=False):
+    """Serve a read endpoint with a strong ETag derived from the data versions.
+
+    Only the small data_versions table is read up front: a matching
+    If-None-Match gets a 304 and a known ETag is answered from
+    response_body_cache, both without running the view. Use below
+    @auth_required; ``per_user`` adds the token subject to the tag.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with SessionLocal() as s:
+                versions = dict(
+                    s.query(DataVersion.scope, DataVersion.version).filter(DataVersion.scope.in_(scopes))
+                )
+            parts = [request.path, request.query_string.decode()]
+            parts += [f"{scope}={versions.get(scope, 0)}" for scope in scopes]
+            if per_user:
+                parts.append(request.user.get("sub") or "")
+            etag = hashlib.sha1("|".join(parts).encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached = response_body_cache.get(etag)
+                if cached is None:
+                    response = app.make_response(fn(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response_body_cache.set(etag, (response.get_data(), response.mimetype))
+                else:
+                    response = Response(cached[0], mimetype=cached[1])
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
+
 # ---------- ROUTES ----------
+@app.errorhandler(HashingBusy)
+def hashing_busy(_exc):
+    response = jsonify({"error": "Server is druk, probeer het zo opnieuw"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+def too_many_attempts(retry_after):
+    response = jsonify({"error": f"Te veel mislukte pogingen, probeer het over {retry_after} seconden opnieuw"})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+
 @app.post("/api/auth/login")
 def login():
+    payload = request.json or {}
+    username = payload.get("username")
+    client_ip = request.remote_addr or ""
+    retry_after = login_throttle.retry_after(client_ip, username)
+    if retry_after:
+        return too_many_attempts(retry_after)
     s = SessionLocal()
     try:
-        payload = request.json or {}
         u = (
             s.query(User)
             .options(joinedload(User.customer))
-            .filter(User.username == payload.get("username"))
+            .filter(User.username == username)
             .first()
         )
-        if not u or not check_password_hash(u.password_hash, payload.get("password","")):
-            return jsonify({"error": "Invalid credentials"}), 401
-        exp = datetime.now(tz=timezone.utc) + timedelta(hours=8)
-        dashboards = resolve_dashboards(u.allowed_dashboards)
-        customer_payload = None
-        if u.role == "klant":
-            dashboards = ["klantportaal"]
-            if u.customer:
-                customer_payload = {
-                    "id": u.customer.id,
-                    "number": u.customer.number,
-                    "name": u.customer.name,
-                    "email": u.customer.email,
-                    "address": u.customer.address,
-                }
-        token = jwt.encode(
-            {"sub": u.username, "role": u.role, "dashboards": dashboards, "exp": exp},
-            JWT_SECRET,
-            algorithm="HS256",
-        )
-        response = {"token": token, "role": u.role, "dashboards": dashboards}
-        if customer_payload:
-            response["customer"] = customer_payload
-        return jsonify(response)
+        if u:
+            # Detach the row so no DB connection is held while hashing.
+            s.expunge_all()
     finally:
         s.close()
+    password = payload.get("password", "")
+    if not u or not verify_password(u.password_hash, password):
+        login_throttle.failed(client_ip, username)
+        return jsonify({"error": "Invalid credentials"}), 401
+    login_throttle.succeeded(client_ip, username)
+    if needs_rehash(u.password_hash):
+        new_hash = hash_password(password)
+        s = SessionLocal()
+        try:
+            s.execute(
+                update(User)
+                .where(User.id == u.id, User.password_hash == u.password_hash)
+                .values(password_hash=new_hash)
+            )
+            s.commit()
+        finally:
+            s.close()
+    exp = datetime.now(tz=timezone.utc) + timedelta(hours=8)
+    dashboards = resolve_dashboards(u.allowed_dashboards)
+    customer_payload = None
+    if u.role == "klant":
+        dashboards = ["klantportaal"]
+        if u.customer:
+            customer_payload = {
+                "id": u.customer.id,
+                "number": u.customer.number,
+                "name": u.customer.name,
+                "email": u.customer.email,
+                "address": u.customer.address,
+            }
+    token = jwt.encode(
+        {"sub": u.username, "role": u.role, "dashboards": dashboards, "exp": exp},
+        JWT_SECRET,
+        algorithm="HS256",
+    )
+    response = {"token": token, "role": u.role, "dashboards": dashboards}
+    if customer_payload:
+        response["customer"] = customer_payload
+    return jsonify(response)
 
 
 @app.post("/api/auth/customer-reset")
@@ -308,22 +849,29 @@ def customer_reset_password():
         return jsonify({"error": "Gebruikersnaam, klantnummer en nieuw wachtwoord zijn verplicht"}), 400
     if len(new_password) < 6:
         return jsonify({"error": "Nieuw wachtwoord minimaal 6 tekens"}), 400
+    client_ip = request.remote_addr or ""
+    retry_after = login_throttle.retry_after(client_ip, username)
+    if retry_after:
+        return too_many_attempts(retry_after)
 
     s = SessionLocal()
     try:
         user = get_user_by_username(s, username)
         if not user or user.role != "klant":
+            login_throttle.failed(client_ip, username)
             return jsonify({"error": "Account niet gevonden"}), 404
         if not user.customer_id:
             return jsonify({"error": "Account is niet gekoppeld aan een klant"}), 400
         customer = s.query(Customer).get(user.customer_id)
         if not customer or customer.number != customer_number:
+            login_throttle.failed(client_ip, username)
             return jsonify({"error": "Klantnummer komt niet overeen"}), 400
         stored_email = (customer.email or "").strip().lower()
         if stored_email:
             if not email or stored_email != email:
+                login_throttle.failed(client_ip, username)
                 return jsonify({"error": "Emailadres komt niet overeen"}), 400
-        user.password_hash = generate_password_hash(new_password)
+        user.password_hash = hash_password(new_password)
         s.commit()
         return jsonify({"ok": True})
     finally:
@@ -345,21 +893,16 @@ def normalize_customer_number(value):
 
 def aggregate_customer_totals(s, customer_id):
     tx_rows = (
-        s.query(
-            Transaction.product_key,
-            Transaction.tx_type,
-            func.coalesce(func.sum(Transaction.amount), 0).label("total"),
-        )
-        .filter(Transaction.customer_id == customer_id)
-        .group_by(Transaction.product_key, Transaction.tx_type)
+        s.query(CustomerTotal.product_key, CustomerTotal.tx_type, CustomerTotal.total)
+        .filter(CustomerTotal.customer_id == customer_id)
         .all()
     )
     totals = {"issue": {}, "return": {}}
     for product_key, tx_type, total in tx_rows:
         totals.setdefault(tx_type, {})[product_key] = int(total)
     coins_total = (
-        s.query(func.coalesce(func.sum(CoinTransaction.amount), 0))
-        .filter(CoinTransaction.customer_id == customer_id)
+        s.query(CustomerCoinTotal.total)
+        .filter(CustomerCoinTotal.customer_id == customer_id)
         .scalar()
     )
     return totals, int(coins_total or 0)
@@ -437,12 +980,13 @@ def create_user():
         stored_dashboards = dashboards_to_store(dashboards)
         user = User(
             username=username,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             role=role,
             allowed_dashboards=stored_dashboards,
             customer_id=customer_id,
         )
         s.add(user)
+        bump_data_version(s, "customers")  # account <-> customer link for /api/customer/me
         s.commit()
         return jsonify({"id": user.id}), 201
     finally:
@@ -453,50 +997,56 @@ def create_user():
 @auth_required(roles=["admin"], dashboards=["accounts"])
 def update_user(user_id):
     data = request.json or {}
+    new_password = data.get("password")
+    if new_password and len(new_password) < 6:
+        return jsonify({"error": "Wachtwoord minimaal 6 tekens"}), 400
+    # Hashed once up front, not again on every retry below.
+    password_hash = hash_password(new_password) if new_password else None
     s = SessionLocal()
     try:
-        user = s.query(User).get(user_id)
-        if not user:
-            return jsonify({"error": "Gebruiker niet gevonden"}), 404
-        role = data.get("role")
-        if role:
-            if role not in {"admin", "medewerker", "klant"}:
-                return jsonify({"error": "Ongeldige rol"}), 400
-            user.role = role
-        target_role = user.role
-        customer_number = normalize_customer_number(
-            data.get("customerNumber") or data.get("customer_number")
-        )
-        if target_role == "klant":
-            if customer_number:
-                customer = (
-                    s.query(Customer)
-                    .filter(Customer.number == customer_number)
-                    .first()
-                )
-                if not customer:
-                    return jsonify({"error": "Klantnummer niet gevonden"}), 404
-                user.customer_id = customer.id
-            if not user.customer_id:
-                return jsonify({"error": "Klantaccount vereist koppeling met klantnummer"}), 400
-            user.allowed_dashboards = dashboards_to_store(["klantportaal"])
-        else:
-            if user.customer_id:
-                user.customer_id = None
-            dashboards = data.get("dashboards")
-            if dashboards is not None:
-                user.allowed_dashboards = dashboards_to_store(
-                    resolve_dashboards(dashboards)
-                )
-            elif data.get("role"):
-                user.allowed_dashboards = dashboards_to_store(["dashboard"])
-        new_password = data.get("password")
-        if new_password:
-            if len(new_password) < 6:
-                return jsonify({"error": "Wachtwoord minimaal 6 tekens"}), 400
-            user.password_hash = generate_password_hash(new_password)
-        s.commit()
-        return jsonify({"ok": True})
+        def work():
+            user = s.query(User).get(user_id)
+            if not user:
+                return jsonify({"error": "Gebruiker niet gevonden"}), 404
+            role = data.get("role")
+            if role:
+                if role not in {"admin", "medewerker", "klant"}:
+                    return jsonify({"error": "Ongeldige rol"}), 400
+                user.role = role
+            target_role = user.role
+            customer_number = normalize_customer_number(
+                data.get("customerNumber") or data.get("customer_number")
+            )
+            if target_role == "klant":
+                if customer_number:
+                    customer = (
+                        s.query(Customer)
+                        .filter(Customer.number == customer_number)
+                        .first()
+                    )
+                    if not customer:
+                        return jsonify({"error": "Klantnummer niet gevonden"}), 404
+                    user.customer_id = customer.id
+                if not user.customer_id:
+                    return jsonify({"error": "Klantaccount vereist koppeling met klantnummer"}), 400
+                user.allowed_dashboards = dashboards_to_store(["klantportaal"])
+            else:
+                if user.customer_id:
+                    user.customer_id = None
+                dashboards = data.get("dashboards")
+                if dashboards is not None:
+                    user.allowed_dashboards = dashboards_to_store(
+                        resolve_dashboards(dashboards)
+                    )
+                elif data.get("role"):
+                    user.allowed_dashboards = dashboards_to_store(["dashboard"])
+            if password_hash:
+                user.password_hash = password_hash
+            bump_data_version(s, "customers")
+            s.commit()
+            return jsonify({"ok": True})
+
+        return run_with_retry(s, work)
     finally:
         s.close()
 
@@ -504,9 +1054,22 @@ def update_user(user_id):
 def health():
     return jsonify({"status": "ok", "time": datetime.utcnow().isoformat()})
 
+
+@app.get("/api/metrics")
+@auth_required(roles=["admin"], dashboards=["instellingen"])
+def metrics():
+    return jsonify({
+        "auth_cache": token_claims_cache.stats(),
+        "customer_cache": customer_id_cache.stats(),
+        "invoice_cache": invoice_cache.stats(),
+        "response_cache": response_body_cache.stats(),
+        "nfc_retention": dict(nfc_purge_stats),
+    })
+
 # Customers
 @app.get("/api/customers")
 @auth_required(roles=["admin","medewerker"], dashboards=["klanten", "facturen", "overzicht", "transacties", "munten"])
+@versioned("customers")
 def list_customers():
     s = SessionLocal()
     try:
@@ -537,16 +1100,20 @@ def create_customer():
     data = request.json or {}
     s = SessionLocal()
     try:
-        c = Customer(
-            number=str(data.get("number", "00")).zfill(2),
-            name=data.get("name", ""),
-            email=data.get("email"),
-            address=data.get("address"),
-            nfc_code=data.get("nfc_code")
-        )
-        s.add(c)
-        s.commit()
-        return jsonify({"id": c.id}), 201
+        def work():
+            c = Customer(
+                number=str(data.get("number", "00")).zfill(2),
+                name=data.get("name", ""),
+                email=data.get("email"),
+                address=data.get("address"),
+                nfc_code=data.get("nfc_code")
+            )
+            s.add(c)
+            bump_data_version(s, "customers")
+            s.commit()
+            return jsonify({"id": c.id}), 201
+
+        return run_with_retry(s, work)
     except IntegrityError:
         s.rollback()
         return jsonify({"error": "Klantnummer of NFC bestaat al"}), 400
@@ -559,27 +1126,31 @@ def update_customer(cust_id):
     data = request.json or {}
     s = SessionLocal()
     try:
-        c = s.query(Customer).get(cust_id)
-        if not c:
-            return jsonify({"error": "Customer not found"}), 404
-        if "number" in data:
-            c.number = str(data["number"]).zfill(2)
-        c.name = data.get("name", c.name)
-        c.email = data.get("email", c.email)
-        c.address = data.get("address", c.address)
-        c.nfc_code = data.get("nfc_code", c.nfc_code)
-        try:
+        def work():
+            c = s.query(Customer).get(cust_id)
+            if not c:
+                return jsonify({"error": "Customer not found"}), 404
+            if "number" in data:
+                c.number = str(data["number"]).zfill(2)
+            c.name = data.get("name", c.name)
+            c.email = data.get("email", c.email)
+            c.address = data.get("address", c.address)
+            c.nfc_code = data.get("nfc_code", c.nfc_code)
+            bump_data_version(s, "customers")  # flushes the customer row first
             s.commit()
-        except IntegrityError:
-            s.rollback()
-            return jsonify({"error": "Klantnummer of NFC bestaat al"}), 400
-        return jsonify({"ok": True})
+            return jsonify({"ok": True})
+
+        return run_with_retry(s, work)
+    except IntegrityError:
+        s.rollback()
+        return jsonify({"error": "Klantnummer of NFC bestaat al"}), 400
     finally:
         s.close()
 
 # Inventory
 @app.get("/api/inventory")
 @auth_required(roles=["admin","medewerker"], dashboards=["voorraad"])
+@versioned("inventory")
 def get_inventory():
     s = SessionLocal()
     try:
@@ -599,12 +1170,16 @@ def add_bulk_inventory():
         return jsonify({"error": "Invalid product or amount"}), 400
     s = SessionLocal()
     try:
-        inv = s.query(Inventory).filter(Inventory.product_key == product).first()
-        if not inv:
-            return jsonify({"error": "Product not found"}), 404
-        inv.units += amount
-        s.commit()
-        return jsonify({"ok": True, "units": inv.units})
+        def work():
+            units = adjust_inventory_units(s, product, amount)
+            if units is None:
+                s.rollback()
+                return jsonify({"error": "Product not found"}), 404
+            bump_data_version(s, "inventory")
+            s.commit()
+            return jsonify({"ok": True, "units": units})
+
+        return run_with_retry(s, work)
     finally:
         s.close()
 
@@ -622,12 +1197,20 @@ def set_inventory_units(product):
         return jsonify({"error": "Onbekend product"}), 400
     s = SessionLocal()
     try:
-        inv = s.query(Inventory).filter(Inventory.product_key == product).first()
-        if not inv:
-            return jsonify({"error": "Product niet gevonden"}), 404
-        inv.units = units
-        s.commit()
-        return jsonify({"ok": True, "units": inv.units})
+        def work():
+            updated = (
+                s.query(Inventory)
+                .filter(Inventory.product_key == product)
+                .update({Inventory.units: units}, synchronize_session=False)
+            )
+            if not updated:
+                s.rollback()
+                return jsonify({"error": "Product niet gevonden"}), 404
+            bump_data_version(s, "inventory")
+            s.commit()
+            return jsonify({"ok": True, "units": units})
+
+        return run_with_retry(s, work)
     finally:
         s.close()
 
@@ -635,9 +1218,105 @@ def set_inventory_units(product):
 def get_customer_by_identifier(s, identifier):
     if identifier is None:
         return None
-    cust = s.query(Customer).filter(Customer.number == str(identifier).zfill(2)).first()
-    if cust: return cust
-    return s.query(Customer).filter(Customer.nfc_code == identifier).first()
+    return get_customers_by_identifiers(s, [identifier]).get(identifier)
+
+
+def get_customers_by_identifiers(s, identifiers):
+    """Resolve many identifiers in one query, preferring a match on the
+    zero-padded customer number over a match on the NFC code."""
+    wanted = {i for i in identifiers if i is not None}
+    if not wanted:
+        return {}
+    numbers = {str(i).zfill(2) for i in wanted}
+    codes = {str(i) for i in wanted}
+    customers = (
+        s.query(Customer)
+        .filter(or_(Customer.number.in_(numbers), Customer.nfc_code.in_(codes)))
+        .all()
+    )
+    by_number = {c.number: c for c in customers}
+    by_nfc = {c.nfc_code: c for c in customers if c.nfc_code}
+    resolved = {}
+    for identifier in wanted:
+        cust = by_number.get(str(identifier).zfill(2)) or by_nfc.get(str(identifier))
+        if cust:
+            resolved[identifier] = cust
+    return resolved
+
+
+def resolve_customer_ids(s, identifiers):
+    """Map identifiers to customer ids, serving repeat scans from the cache.
+
+    The "customers" data version is read before the customers themselves, so
+    a lookup that races with a customer edit is stored under the version
+    from before the edit and ignored afterwards.
+    """
+    version = current_data_version(s, "customers")
+    resolved = {}
+    missing = []
+    for identifier in identifiers:
+        if identifier is None or identifier in resolved:
+            continue
+        cached = customer_id_cache.get(str(identifier))
+        if cached is None or cached[1] != version:
+            missing.append(identifier)
+        else:
+            resolved[identifier] = cached[0]
+    if missing:
+        for identifier, cust in get_customers_by_identifiers(s, missing).items():
+            customer_id_cache.set(str(identifier), (cust.id, version))
+            resolved[identifier] = cust.id
+    return resolved
+
+
+def resolve_customer_id(s, identifier):
+    return resolve_customer_ids(s, [identifier]).get(identifier)
+
+
+def _is_retryable_db_error(exc):
+    """Lock conflicts worth retrying: SQLite busy, MySQL deadlock/lock timeout."""
+    orig = getattr(exc, "orig", None)
+    code = orig.args[0] if orig is not None and orig.args else None
+    message = str(orig or exc).lower()
+    return code in (1205, 1213) or "database is locked" in message or "deadlock" in message
+
+
+def run_with_retry(s, work):
+    """Run ``work()`` (which commits) again after lock conflicts, with backoff."""
+    for attempt in range(DB_RETRY_ATTEMPTS):
+        try:
+            return work()
+        except OperationalError as exc:
+            s.rollback()
+            if attempt == DB_RETRY_ATTEMPTS - 1 or not _is_retryable_db_error(exc):
+                raise
+            time.sleep(DB_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random()))
+
+
+def adjust_inventory_units(s, product, delta, required=None):
+    """Atomically add ``delta`` to the product stock inside the current transaction.
+
+    Decrements only succeed while enough units remain (``units >= n`` is part of
+    the UPDATE), so concurrent tills can never oversell or lose updates.
+    ``required`` overrides that minimum stock (default ``-delta``), e.g. for a
+    batch whose issues come before its returns. Returns the new stock, or None
+    when the product is missing or short.
+    """
+    q = s.query(Inventory).filter(Inventory.product_key == product)
+    if required is None:
+        required = -delta
+    if required > 0:
+        q = q.filter(Inventory.units >= required)
+    if not q.update({Inventory.units: Inventory.units + delta}, synchronize_session=False):
+        return None
+    return s.query(Inventory.units).filter(Inventory.product_key == product).scalar()
+
+
+def inventory_error(s, product):
+    """Explain why adjust_inventory_units refused: (message, status)."""
+    if not s.query(Inventory.id).filter(Inventory.product_key == product).first():
+        return "Product not found", 404
+    return "Not enough inventory", 400
 
 
 @app.post("/api/transaction")
@@ -655,22 +1334,238 @@ def create_transaction():
 
     s = SessionLocal()
     try:
-        cust = get_customer_by_identifier(s, identifier)
-        if not cust:
+        customer_id = resolve_customer_id(s, identifier)
+        if customer_id is None:
             return jsonify({"error": "Customer not found"}), 404
-        inv = s.query(Inventory).filter(Inventory.product_key == product).first()
-        if not inv:
-            return jsonify({"error": "Product not found"}), 404
-        if tx_type == "issue":
-            if inv.units < amount:
-                return jsonify({"error": "Not enough inventory"}), 400
-            inv.units -= amount
-        else:
-            inv.units += amount
-        t = Transaction(customer_id=cust.id, product_key=product, amount=amount, tx_type=tx_type)
-        s.add(t)
-        s.commit()
-        return jsonify({"ok": True, "new_units": inv.units, "transaction_id": t.id})
+
+        def work():
+            new_units = adjust_inventory_units(s, product, -amount if tx_type == "issue" else amount)
+            if new_units is None:
+                s.rollback()
+                error, status = inventory_error(s, product)
+                return jsonify({"error": error}), status
+            t = Transaction(customer_id=customer_id, product_key=product, amount=amount, tx_type=tx_type)
+            s.add(t)
+            record_transaction_total(s, customer_id, product, tx_type, amount)
+            s.commit()
+            bump_data_version_after_commit("inventory", "totals")
+            return jsonify({"ok": True, "new_units": new_units, "transaction_id": t.id})
+
+        return run_with_retry(s, work)
+    finally:
+        s.close()
+
+@app.post("/api/transactions/batch")
+@auth_required(roles=["admin","medewerker"], dashboards=["transacties"])
+def create_transactions_batch():
+    """Register several issue/return lines at once; all lines commit or none do."""
+    data = request.get_json(silent=True) or {}
+    raw_lines = data.get("lines")
+    if not isinstance(raw_lines, list) or not raw_lines:
+        return jsonify({"error": "lines ontbreekt"}), 400
+    if len(raw_lines) > TRANSACTION_BATCH_MAX_LINES:
+        return jsonify({"error": f"Maximaal {TRANSACTION_BATCH_MAX_LINES} regels per batch"}), 400
+
+    default_identifier = data.get("identifier")
+    lines = []
+    errors = []
+    for index, raw in enumerate(raw_lines):
+        raw = raw if isinstance(raw, dict) else {}
+        try:
+            amount = int(raw.get("amount", 0))
+        except (TypeError, ValueError):
+            amount = 0
+        line = {
+            "line": index,
+            "identifier": raw.get("identifier", default_identifier),
+            "product": raw.get("product"),
+            "amount": amount,
+            "type": raw.get("type"),
+        }
+        if line["type"] not in ("issue", "return"):
+            errors.append({"line": index, "error": "Invalid type"})
+        elif line["product"] not in ("hardcups", "champagne", "cocktail") or amount <= 0:
+            errors.append({"line": index, "error": "Invalid product or amount"})
+        lines.append(line)
+    if errors:
+        return jsonify({"error": "Ongeldige regels", "results": errors}), 400
+
+    s = SessionLocal()
+    try:
+        customer_ids = resolve_customer_ids(s, [l["identifier"] for l in lines])
+        missing = [
+            {"line": l["line"], "error": "Customer not found"}
+            for l in lines
+            if l["identifier"] not in customer_ids
+        ]
+        if missing:
+            return jsonify({"error": "Customer not found", "results": missing}), 404
+
+        # Lines apply in order: per product the running change after each line
+        # and the deepest point it reaches, so an issue is only covered by
+        # returns that come before it in the batch.
+        deltas = {}
+        required = {}
+        running = []
+        rollup = {}
+        for l in lines:
+            sign = -1 if l["type"] == "issue" else 1
+            deltas[l["product"]] = deltas.get(l["product"], 0) + sign * l["amount"]
+            required[l["product"]] = max(required.get(l["product"], 0), -deltas[l["product"]])
+            running.append(deltas[l["product"]])
+            key = (customer_ids[l["identifier"]], l["product"], l["type"])
+            rollup[key] = rollup.get(key, 0) + l["amount"]
+
+        def work():
+            new_units = {}
+            # Fixed product order so concurrent batches lock rows consistently.
+            for product in sorted(deltas):
+                units = adjust_inventory_units(s, product, deltas[product], required=required[product])
+                if units is None:
+                    s.rollback()
+                    error, status = inventory_error(s, product)
+                    failed = [
+                        {"line": l["line"], "error": error}
+                        for l in lines
+                        if l["product"] == product
+                    ]
+                    if status == 400:
+                        # Point at the first line that takes the stock below zero.
+                        stock = s.query(Inventory.units).filter(Inventory.product_key == product).scalar() or 0
+                        short = [
+                            {"line": l["line"], "error": error}
+                            for l, change in zip(lines, running)
+                            if l["product"] == product and stock + change < 0
+                        ]
+                        failed = short[:1] or failed
+                    return jsonify({"error": error, "results": failed}), status
+                new_units[product] = units
+            txs = [
+                Transaction(
+                    customer_id=customer_ids[l["identifier"]],
+                    product_key=l["product"],
+                    amount=l["amount"],
+                    tx_type=l["type"],
+                )
+                for l in lines
+            ]
+            s.add_all(txs)
+            for (customer_id, product, tx_type), amount in rollup.items():
+                record_transaction_total(s, customer_id, product, tx_type, amount)
+            s.commit()
+            bump_data_version_after_commit("inventory", "totals")
+            return jsonify(
+                {
+                    "ok": True,
+                    "results": [
+                        {
+                            "line": l["line"],
+                            "ok": True,
+                            "transaction_id": t.id,
+                            "customer_id": t.customer_id,
+                            # Stock right after this line.
+                            "new_units": new_units[l["product"]] - deltas[l["product"]] + change,
+                        }
+                        for l, t, change in zip(lines, txs, running)
+                    ],
+                    "inventory": new_units,
+                }
+            )
+
+        return run_with_retry(s, work)
+    finally:
+        s.close()
+
+
+def encode_tx_cursor(created_at, tx_id):
+    raw = f"{created_at.isoformat()}|{tx_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_tx_cursor(cursor):
+    """Return (created_at, id) from an opaque cursor, or None if it is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, tx_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(tx_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+@app.get("/api/transactions")
+@auth_required(roles=["admin","medewerker"], dashboards=["transacties"])
+def list_transactions():
+    """Newest-first transaction history, paged on (created_at, id).
+
+    Each page seeks past the cursor instead of using OFFSET, so fetching a
+    page costs the same at the start and the end of the ledger.
+    """
+    try:
+        limit = int(request.args.get("limit", TRANSACTION_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Ongeldige limit"}), 400
+    limit = max(1, min(limit, TRANSACTION_PAGE_MAX))
+    product = request.args.get("product")
+    if product and product not in ("hardcups", "champagne", "cocktail"):
+        return jsonify({"error": "Invalid product"}), 400
+    tx_type = request.args.get("type")
+    if tx_type and tx_type not in ("issue", "return"):
+        return jsonify({"error": "Invalid type"}), 400
+    cursor = None
+    if request.args.get("cursor"):
+        cursor = decode_tx_cursor(request.args["cursor"])
+        if cursor is None:
+            return jsonify({"error": "Ongeldige cursor"}), 400
+
+    s = SessionLocal()
+    try:
+        filters, error = parse_ledger_filters(s)
+        if error:
+            return error
+        clauses = ledger_filters(Transaction, **filters)
+        if product:
+            clauses.append(Transaction.product_key == product)
+        if tx_type:
+            clauses.append(Transaction.tx_type == tx_type)
+        if cursor:
+            created_at, tx_id = cursor
+            # The leading "<=" keeps the condition usable as an index range.
+            clauses.append(and_(
+                Transaction.created_at <= created_at,
+                or_(Transaction.created_at < created_at, Transaction.id < tx_id),
+            ))
+        rows = s.execute(
+            select(
+                Transaction.id,
+                Transaction.created_at,
+                Transaction.customer_id,
+                Customer.number,
+                Transaction.product_key,
+                Transaction.tx_type,
+                Transaction.amount,
+            )
+            .join(Customer, Transaction.customer_id == Customer.id)
+            .where(*clauses)
+            .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            "items": [
+                {
+                    "id": r.id,
+                    "created_at": r.created_at.isoformat(),
+                    "customer_id": r.customer_id,
+                    "customer_number": r.number,
+                    "product": r.product_key,
+                    "type": r.tx_type,
+                    "amount": r.amount,
+                }
+                for r in rows
+            ],
+            "next_cursor": encode_tx_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        })
     finally:
         s.close()
 
@@ -689,13 +1584,20 @@ def coins_intake():
 
     s = SessionLocal()
     try:
-        cust = get_customer_by_identifier(s, identifier)
-        if not cust:
+        customer_id = resolve_customer_id(s, identifier)
+        if customer_id is None:
             return jsonify({"error": "Klant niet gevonden"}), 404
-        tx = CoinTransaction(customer_id=cust.id, amount=amount, recorded_by=request.user.get("sub"))
-        s.add(tx)
-        s.commit()
-        return jsonify({"ok": True, "coin_id": tx.id})
+        recorded_by = request.user.get("sub")
+
+        def work():
+            tx = CoinTransaction(customer_id=customer_id, amount=amount, recorded_by=recorded_by)
+            s.add(tx)
+            record_coin_total(s, customer_id, amount)
+            s.commit()
+            bump_data_version_after_commit("totals")
+            return jsonify({"ok": True, "coin_id": tx.id})
+
+        return run_with_retry(s, work)
     finally:
         s.close()
 
@@ -736,6 +1638,7 @@ def coins_daily():
 
 @app.get("/api/coins/customers")
 @auth_required(roles=["admin", "medewerker"], dashboards=["munten"])
+@versioned("customers", "totals")
 def coins_by_customer():
     s = SessionLocal()
     try:
@@ -744,10 +1647,9 @@ def coins_by_customer():
                 Customer.id,
                 Customer.name,
                 Customer.number,
-                func.coalesce(func.sum(CoinTransaction.amount), 0).label("total"),
+                func.coalesce(CustomerCoinTotal.total, 0).label("total"),
             )
-            .join(CoinTransaction, CoinTransaction.customer_id == Customer.id, isouter=True)
-            .group_by(Customer.id)
+            .join(CustomerCoinTotal, CustomerCoinTotal.customer_id == Customer.id, isouter=True)
             .order_by(Customer.number.asc())
             .all()
         )
@@ -768,29 +1670,22 @@ def coins_by_customer():
 
 @app.get("/api/customers/summary")
 @auth_required(roles=["admin", "medewerker"], dashboards=["overzicht"])
+@versioned("customers", "totals")
 def customers_summary():
     s = SessionLocal()
     try:
         customers = s.query(Customer).order_by(Customer.number.asc()).all()
-        tx_rows = (
-            s.query(
-                Transaction.customer_id,
-                Transaction.product_key,
-                Transaction.tx_type,
-                func.coalesce(func.sum(Transaction.amount), 0).label("total"),
-            )
-            .group_by(Transaction.customer_id, Transaction.product_key, Transaction.tx_type)
-            .all()
-        )
+        tx_rows = s.query(
+            CustomerTotal.customer_id,
+            CustomerTotal.product_key,
+            CustomerTotal.tx_type,
+            CustomerTotal.total,
+        ).all()
         totals = {}
         for customer_id, product_key, tx_type, total in tx_rows:
             key = totals.setdefault(customer_id, {"issue": {}, "return": {}})
             key[tx_type][product_key] = int(total)
-        coin_rows = (
-            s.query(CoinTransaction.customer_id, func.coalesce(func.sum(CoinTransaction.amount), 0))
-            .group_by(CoinTransaction.customer_id)
-            .all()
-        )
+        coin_rows = s.query(CustomerCoinTotal.customer_id, CustomerCoinTotal.total).all()
         coin_totals = {cid: int(total) for cid, total in coin_rows}
         results = []
         for c in customers:
@@ -822,6 +1717,7 @@ def customers_summary():
 
 @app.get("/api/customer/me")
 @auth_required(roles=["klant"], dashboards=["klantportaal"])
+@versioned("customers", "totals", per_user=True)
 def customer_self():
     s = SessionLocal()
     try:
@@ -867,23 +1763,25 @@ def customer_self():
 # Dashboard
 @app.get("/api/dashboard")
 @auth_required(roles=["admin","medewerker"], dashboards=["dashboard"])
+@versioned("inventory", "totals")
 def dashboard():
     s = SessionLocal()
     try:
         inv = s.query(Inventory).all()
         inventory = {i.product_key: i.units for i in inv}
-        issued = dict(
-            s.query(Transaction.product_key, func.coalesce(func.sum(Transaction.amount), 0))
-            .filter(Transaction.tx_type == "issue")
-            .group_by(Transaction.product_key)
-            .all()
-        )
-        returned = dict(
-            s.query(Transaction.product_key, func.coalesce(func.sum(Transaction.amount), 0))
-            .filter(Transaction.tx_type == "return")
-            .group_by(Transaction.product_key)
+        issued = {}
+        returned = {}
+        rows = (
+            s.query(
+                CustomerTotal.product_key,
+                CustomerTotal.tx_type,
+                func.coalesce(func.sum(CustomerTotal.total), 0),
+            )
+            .group_by(CustomerTotal.product_key, CustomerTotal.tx_type)
             .all()
         )
+        for product_key, tx_type, total in rows:
+            (issued if tx_type == "issue" else returned)[product_key] = total
         ratios = {}
         net = {}
         for key in ("hardcups", "champagne", "cocktail"):
@@ -910,47 +1808,165 @@ def dashboard():
         s.close()
 
 # CSV exports
-@app.get("/api/export/transactions.csv")
-@auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
-def export_txs_csv():
+def stream_download(s, chunks, mimetype, download_name):
+    """Stream ``chunks`` as an attachment; the session closes when streaming ends."""
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            s.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'},
+    )
+
+
+def parse_ledger_filters(s):
+    """Read from/to/customer/since_id query args: (filters, error_response)."""
+    filters = {}
+    for arg, key in (("from", "start"), ("to", "end")):
+        value = request.args.get(arg)
+        if not value:
+            continue
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None, (jsonify({"error": f"Ongeldige datum voor '{arg}'"}), 400)
+        if key == "end" and len(value) == 10:
+            parsed = datetime.combine(parsed.date(), datetime.max.time())
+        filters[key] = parsed
+    since_id = request.args.get("since_id")
+    if since_id:
+        try:
+            filters["since_id"] = int(since_id)
+        except ValueError:
+            return None, (jsonify({"error": "Ongeldige since_id"}), 400)
+    customer = request.args.get("customer")
+    if customer:
+        customer_id = resolve_customer_id(s, customer)
+        if customer_id is None:
+            return None, (jsonify({"error": "Customer not found"}), 404)
+        filters["customer_id"] = customer_id
+    return filters, None
+
+
+def ledger_export(model, build_chunks, mimetype, download_name):
+    """Stream a filtered ledger export pinned to its highest id, which is
+    reported in X-Export-Last-Id for incremental syncs. Those (``since_id``)
+    stop at the highest settled id instead (see last_ledger_id); full and
+    date-range exports include everything committed so far."""
     s = SessionLocal()
     try:
-        path = export_transactions_csv(s, Transaction, Customer)
-        return send_file(path, mimetype="text/csv", as_attachment=True, download_name="transacties.csv")
-    finally:
+        filters, error = parse_ledger_filters(s)
+        if error:
+            s.close()
+            return error
+        settled_before = None
+        if "since_id" in filters:
+            settled_before = datetime.utcnow() - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+        last_id = last_ledger_id(s, model, settled_before=settled_before, **filters)
+        if last_id is None:
+            last_id = filters.get("since_id", 0)
+        filters["until_id"] = last_id
+    except Exception:
         s.close()
+        raise
+    response = stream_download(s, build_chunks(s, filters), mimetype, download_name)
+    response.headers["X-Export-Last-Id"] = str(last_id)
+    return response
+
+
+@app.get("/api/export/transactions.csv")
+@auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
+def export_txs_csv():
+    return ledger_export(
+        Transaction,
+        lambda s, filters: export_transactions_csv(s, Transaction, Customer, **filters),
+        "text/csv",
+        "transacties.csv",
+    )
+
+
+LEDGER_EXPORTS = {
+    "transactions": (Transaction, transactions_ledger_select, TRANSACTION_LEDGER_COLUMNS, "transacties"),
+    "coins": (CoinTransaction, coins_ledger_select, COIN_LEDGER_COLUMNS, "munten"),
+}
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+@app.get("/api/export/<any(transactions, coins):ledger>.<any(ndjson, parquet, arrow):fmt>")
+@auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
+def export_ledger(ledger, fmt):
+    model, build_select, columns, basename = LEDGER_EXPORTS[ledger]
+    if fmt != "ndjson" and not arrow_available():
+        return jsonify({"error": "Parquet/Arrow-export vereist het pakket pyarrow"}), 501
+
+    def build_chunks(s, filters):
+        stmt = build_select(model, Customer, **filters)
+        if fmt == "ndjson":
+            return export_ledger_ndjson(s, stmt, columns)
+        return export_ledger_arrow(s, stmt, columns, fmt)
+
+    return ledger_export(model, build_chunks, EXPORT_FORMATS[fmt], f"{basename}.{fmt}")
 
 @app.get("/api/export/inventory.csv")
 @auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
 def export_inv_csv():
     s = SessionLocal()
-    try:
-        path = export_inventory_csv(s, Inventory)
-        return send_file(path, mimetype="text/csv", as_attachment=True, download_name="voorraad.csv")
-    finally:
-        s.close()
+    return stream_download(s, export_inventory_csv(s, Inventory), "text/csv", "voorraad.csv")
 
 
-@app.post("/api/nfc/push")
-def nfc_push():
+def _bridge_auth_error():
     if not _bridge_enabled():
         return jsonify({"error": "NFC bridge niet geconfigureerd"}), 503
-
     provided = request.headers.get("X-NFC-Bridge-Token") or request.args.get("token")
     if not provided or provided != NFC_BRIDGE_TOKEN:
         return jsonify({"error": "Ongeldige bridge-token"}), 403
+    return None
 
-    payload = request.get_json(silent=True) or {}
+
+def _bridge_scan_from_payload(payload):
+    """Build an NfcScan from a pushed item, or None when the code is missing.
+
+    ``age_seconds`` is how long the bridge held the scan before uploading it;
+    it is subtracted from the receive time so scans buffered while offline
+    keep their real scan time and expire via NFC_BRIDGE_MAX_AGE_SECONDS.
+    """
     code = (payload.get("nfc_code") or payload.get("code") or "").strip()
     if not code:
+        return None
+    try:
+        age = max(0.0, float(payload.get("age_seconds") or 0))
+    except (TypeError, ValueError):
+        age = 0.0
+    return NfcScan(
+        nfc_code=code,
+        source=payload.get("source") or NFC_BRIDGE_SOURCE,
+        created_at=datetime.utcnow() - timedelta(seconds=age),
+    )
+
+
+@app.post("/api/nfc/push")
+def nfc_push():
+    error = _bridge_auth_error()
+    if error:
+        return error
+
+    scan = _bridge_scan_from_payload(request.get_json(silent=True) or {})
+    if scan is None:
         return jsonify({"error": "nfc_code ontbreekt"}), 400
 
-    source = payload.get("source") or NFC_BRIDGE_SOURCE
     session = SessionLocal()
     try:
-        scan = NfcScan(nfc_code=code, source=source)
         session.add(scan)
         session.commit()
+        _notify_nfc_scan()
         return (
             jsonify(
                 {
@@ -965,69 +1981,314 @@ def nfc_push():
         session.close()
 
 
+@app.post("/api/nfc/push/batch")
+def nfc_push_batch():
+    """Store several buffered bridge scans in one transaction."""
+    error = _bridge_auth_error()
+    if error:
+        return error
+
+    items = (request.get_json(silent=True) or {}).get("scans")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "scans ontbreekt"}), 400
+    if len(items) > NFC_PUSH_BATCH_MAX:
+        return jsonify({"error": f"Maximaal {NFC_PUSH_BATCH_MAX} scans per batch"}), 400
+    scans = [_bridge_scan_from_payload(item) if isinstance(item, dict) else None for item in items]
+    if any(scan is None for scan in scans):
+        return jsonify({"error": "nfc_code ontbreekt"}), 400
+
+    session = SessionLocal()
+    try:
+        session.add_all(scans)
+        session.commit()
+        _notify_nfc_scan()
+        return jsonify({"status": "stored", "ids": [scan.id for scan in scans]}), 201
+    finally:
+        session.close()
+
+
 # NFC bridge helpers
-def _pop_pending_bridge_scan(session):
+def _pop_pending_bridge_scan(session, source=None):
+    """Claim the oldest recent unconsumed scan, optionally for one source.
+
+    The claim is a conditional UPDATE on ``consumed``, so when two tills race
+    for the same row only one gets rowcount 1; the other moves on to the next
+    candidate.
+    """
     cutoff = datetime.utcnow() - timedelta(seconds=NFC_BRIDGE_MAX_AGE_SECONDS)
-    scan = (
-        session.query(NfcScan)
-        .filter(NfcScan.consumed.is_(False), NfcScan.created_at >= cutoff)
-        .order_by(NfcScan.created_at.asc())
-        .first()
+    query = session.query(NfcScan.id).filter(
+        NfcScan.consumed.is_(False), NfcScan.created_at >= cutoff
     )
-    if not scan:
-        return None
-    scan.consumed = True
-    scan.consumed_at = datetime.utcnow()
-    session.commit()
-    return scan
+    if source:
+        query = query.filter(NfcScan.source == source)
+    while True:
+        candidates = [
+            row.id for row in query.order_by(NfcScan.created_at.asc(), NfcScan.id.asc()).limit(5)
+        ]
+        if not candidates:
+            session.rollback()
+            return None
+        for scan_id in candidates:
+            claimed = session.execute(
+                NfcScan.__table__.update()
+                .where(NfcScan.id == scan_id, NfcScan.consumed.is_(False))
+                .values(consumed=True, consumed_at=datetime.utcnow())
+            ).rowcount
+            if claimed:
+                session.commit()
+                return session.get(NfcScan, scan_id)
+        # Lost every race: start a fresh transaction so the next SELECT sees
+        # the other tills' claims (MySQL would otherwise reuse its snapshot).
+        session.rollback()
 
 
 def _bridge_enabled():
     return bool(NFC_BRIDGE_TOKEN)
 
 
+# nfc_scans retention: consumed scans and scans that expired unclaimed are
+# deleted once they are older than NFC_SCAN_RETENTION_HOURS.
+nfc_purge_stats = {"runs": 0, "purged_total": 0, "last_purged": 0, "last_run_at": None, "last_duration_ms": None}
+_nfc_purge_lock = threading.Lock()
+_nfc_sweeper_pid = None
+
+
+def purge_nfc_scans(retention_hours=None, batch_size=None):
+    """Delete old scans in small batches, one commit each, and return the count.
+
+    Short transactions keep the table available to nfc_push and the tills
+    while a large backlog is cleared.
+    """
+    retention_hours = NFC_SCAN_RETENTION_HOURS if retention_hours is None else retention_hours
+    batch_size = batch_size or NFC_PURGE_BATCH_SIZE
+    keep = max(timedelta(hours=retention_hours), timedelta(seconds=NFC_BRIDGE_MAX_AGE_SECONDS))
+    cutoff = datetime.utcnow() - keep
+    started = time.monotonic()
+    purged = 0
+    session = SessionLocal()
+    try:
+        # One pass per consumed flag so each SELECT is a range on the
+        # (consumed, created_at) index.
+        for consumed in (True, False):
+            while True:
+                ids = [
+                    row.id
+                    for row in session.query(NfcScan.id)
+                    .filter(NfcScan.consumed.is_(consumed), NfcScan.created_at < cutoff)
+                    .order_by(NfcScan.created_at.asc())
+                    .limit(batch_size)
+                ]
+                if not ids:
+                    break
+                deleted = run_with_retry(session, lambda: _delete_nfc_scans(session, ids))
+                purged += deleted
+                if len(ids) < batch_size:
+                    break
+        session.rollback()
+    finally:
+        session.close()
+    with _nfc_purge_lock:
+        nfc_purge_stats["runs"] += 1
+        nfc_purge_stats["purged_total"] += purged
+        nfc_purge_stats["last_purged"] = purged
+        nfc_purge_stats["last_run_at"] = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
+        nfc_purge_stats["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return purged
+
+
+def _delete_nfc_scans(session, ids):
+    deleted = session.execute(NfcScan.__table__.delete().where(NfcScan.id.in_(ids))).rowcount
+    session.commit()
+    return deleted
+
+
+def _nfc_sweeper():
+    while True:
+        time.sleep(NFC_PURGE_INTERVAL_SECONDS)
+        try:
+            purge_nfc_scans()
+        except Exception as exc:  # keep sweeping after a transient DB error
+            app.logger.warning("NFC-scans opschonen mislukt: %s", exc)
+
+
+@app.before_request
+def _ensure_nfc_sweeper():
+    """Start the periodic purge once per worker process (when enabled)."""
+    global _nfc_sweeper_pid
+    if NFC_PURGE_INTERVAL_SECONDS <= 0 or _nfc_sweeper_pid == os.getpid():
+        return
+    with _nfc_purge_lock:
+        if _nfc_sweeper_pid == os.getpid():
+            return
+        _nfc_sweeper_pid = os.getpid()
+    threading.Thread(target=_nfc_sweeper, daemon=True, name="nfc-sweeper").start()
+
+
+@app.cli.command("purge-nfc-scans")
+@click.option("--hours", type=float, default=None, help="Bewaartermijn in uren (standaard NFC_SCAN_RETENTION_HOURS).")
+def purge_nfc_scans_command(hours):
+    """Verwijder verwerkte en verlopen NFC-scans ouder dan de bewaartermijn."""
+    purged = purge_nfc_scans(retention_hours=hours)
+    click.echo(f"{purged} NFC-scan(s) verwijderd.")
+
+
+# USB reader (NFC_MODE auto/hardware), opened once per process on first use.
+nfc_reader_manager = ReaderManager(max_age_seconds=NFC_BRIDGE_MAX_AGE_SECONDS)
+
+
+# Wakes long-polling /api/nfc/read requests in this process when a scan is
+# pushed; the sequence number avoids missing a push between check and wait.
+_nfc_scan_signal = threading.Condition()
+_nfc_scan_seq = 0
+_nfc_waiters = 0
+_nfc_watcher_pid = None
+
+
+def _notify_nfc_scan():
+    global _nfc_scan_seq
+    with _nfc_scan_signal:
+        _nfc_scan_seq += 1
+        _nfc_scan_signal.notify_all()
+
+
+def _reserve_nfc_waiter():
+    """Claim one of the NFC_READ_MAX_WAITERS long-poll slots of this process."""
+    global _nfc_waiters
+    with _nfc_scan_signal:
+        if _nfc_waiters >= NFC_READ_MAX_WAITERS:
+            return False
+        _nfc_waiters += 1
+        _nfc_scan_signal.notify_all()  # wakes the watcher when it is idle
+        return True
+
+
+def _release_nfc_waiter():
+    global _nfc_waiters
+    with _nfc_scan_signal:
+        _nfc_waiters -= 1
+
+
+def _nfc_scan_watcher():
+    """Turn scans pushed to other workers into local wake-ups.
+
+    One cheap MAX(id) query per NFC_READ_RECHECK_SECONDS for the whole
+    process, and only while some read is waiting; the waiting reads
+    themselves stay off the database until they are woken.
+    """
+    newest = None
+    while True:
+        with _nfc_scan_signal:
+            _nfc_scan_signal.wait_for(lambda: _nfc_waiters > 0 and NFC_READ_RECHECK_SECONDS > 0)
+        session = SessionLocal()
+        try:
+            latest = session.query(func.max(NfcScan.id)).scalar()
+        except Exception as exc:  # keep watching after a transient DB error
+            app.logger.warning("NFC-scans controleren mislukt: %s", exc)
+            latest = newest
+        finally:
+            session.close()
+        if latest != newest:
+            newest = latest
+            _notify_nfc_scan()
+        time.sleep(NFC_READ_RECHECK_SECONDS)
+
+
+def _ensure_nfc_watcher():
+    global _nfc_watcher_pid
+    if NFC_READ_RECHECK_SECONDS <= 0 or _nfc_watcher_pid == os.getpid():
+        return
+    with _nfc_scan_signal:
+        if _nfc_watcher_pid == os.getpid():
+            return
+        _nfc_watcher_pid = os.getpid()
+    threading.Thread(target=_nfc_scan_watcher, daemon=True, name="nfc-watcher").start()
+
+
+def _wait_for_bridge_scan(wait_seconds, source=None):
+    """Pop a pending bridge scan, waiting up to ``wait_seconds`` for one.
+
+    The table is only queried on entry, when a push wakes us and once more at
+    the deadline, so a waiting till costs no queries of its own. With several
+    server processes a push may land in another worker; the per-process
+    watcher then wakes us (see _nfc_scan_watcher).
+    """
+    if wait_seconds > 0:
+        _ensure_nfc_watcher()
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        with _nfc_scan_signal:
+            seq = _nfc_scan_seq
+        session = SessionLocal()
+        try:
+            scan = run_with_retry(session, lambda: _pop_pending_bridge_scan(session, source))
+            if scan:
+                return {"nfc_code": scan.nfc_code, "source": scan.source}
+        finally:
+            session.close()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        with _nfc_scan_signal:
+            _nfc_scan_signal.wait_for(lambda: _nfc_scan_seq != seq, remaining)
+
+
 # NFC read (hardware + bridge + simulation fallback)
 @app.get("/api/nfc/read")
 @auth_required(roles=["admin","medewerker"], dashboards=["klanten","transacties","munten"])
 def nfc_read():
-    hardware_error = None
-    if NFC_MODE in ("auto", "hardware"):
+    try:
+        wait_seconds = max(0.0, min(float(request.args.get("wait", 0)), NFC_READ_MAX_WAIT_SECONDS))
+    except ValueError:
+        return jsonify({"error": "Ongeldige wachttijd"}), 400
+    # Waiting for a tag is expected to be slow; keep it out of the slow log.
+    g.long_poll = wait_seconds > 0
+    if g.long_poll:
+        if not _reserve_nfc_waiter():
+            response = jsonify({"error": "Te veel kassa's wachten tegelijk op een NFC-scan"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
         try:
-            import nfc  # requires nfcpy
-
-            clf = nfc.ContactlessFrontend("usb")
-            tag = clf.connect(rdwr={"on-connect": lambda tag: False})
-            code = str(tag.identifier.hex())
-            clf.close()
-            return jsonify({"nfc_code": code, "mode": "hardware"})
-        except Exception as e:
-            hardware_error = str(e)
-            if NFC_MODE == "hardware" and not _bridge_enabled():
-                return (
-                    jsonify(
-                        {
-                            "error": "NFC-reader niet beschikbaar",
-                            "mode": "hardware",
-                            "note": hardware_error,
-                        }
-                    ),
-                    503,
-                )
+            return _read_nfc(wait_seconds)
+        finally:
+            _release_nfc_waiter()
+    return _read_nfc(wait_seconds)
 
-    if _bridge_enabled() and NFC_MODE in ("auto", "bridge"):
-        session = SessionLocal()
-        try:
-            scan = _pop_pending_bridge_scan(session)
-            if scan:
-                return jsonify(
+
+def _read_nfc(wait_seconds):
+    """Hardware reader, then bridge scans, then a simulated code (one process only)."""
+    hardware_error = None
+
+    if NFC_MODE in ("auto", "hardware"):
+        nfc_reader_manager.start()
+        if nfc_reader_manager.available:
+            code = nfc_reader_manager.read(wait_seconds)
+            if code:
+                return jsonify({"nfc_code": code, "mode": "hardware"})
+            return jsonify({"error": "Geen NFC-tag gelezen", "mode": "hardware"}), 404
+        hardware_error = nfc_reader_manager.last_error or "NFC-reader niet gevonden"
+        if NFC_MODE == "hardware" and not _bridge_enabled():
+            return (
+                jsonify(
                     {
-                        "nfc_code": scan.nfc_code,
-                        "mode": "bridge",
-                        "source": scan.source or NFC_BRIDGE_SOURCE,
+                        "error": "NFC-reader niet beschikbaar",
+                        "mode": "hardware",
+                        "note": hardware_error,
                     }
-                )
-        finally:
-            session.close()
+                ),
+                503,
+            )
+
+    if _bridge_enabled() and NFC_MODE in ("auto", "bridge"):
+        source = (request.args.get("source") or "").strip() or None
+        scan = _wait_for_bridge_scan(wait_seconds, source)
+        if scan:
+            return jsonify(
+                {
+                    "nfc_code": scan["nfc_code"],
+                    "mode": "bridge",
+                    "source": scan["source"] or NFC_BRIDGE_SOURCE,
+                }
+            )
         if NFC_MODE == "bridge":
             return (
                 jsonify(
@@ -1042,6 +2303,19 @@ def nfc_read():
     sim_note = hardware_error or (
         "Bridge niet geconfigureerd" if NFC_MODE in ("auto", "bridge") else None
     )
+    if not NFC_SIMULATION:
+        if _bridge_enabled() and NFC_MODE == "auto":
+            return jsonify({"error": "Geen recente NFC-scan ontvangen", "mode": "bridge"}), 404
+        return (
+            jsonify(
+                {
+                    "error": "NFC-reader niet beschikbaar in dit serverproces",
+                    "mode": NFC_MODE,
+                    "note": f"{sim_note}; een USB-lezer vraagt WEB_WORKERS=1",
+                }
+            ),
+            503,
+        )
     sim_code = f"NFC{random.randint(10000,99999)}"
     payload = {"nfc_code": sim_code, "mode": "simulation"}
     if sim_note:
@@ -1063,22 +2337,23 @@ def invoice_daily():
         target_date = date.fromisoformat(target_date_str) if target_date_str else date.today()
         start_dt = datetime.combine(target_date, datetime.min.time())
         end_dt = datetime.combine(target_date, datetime.max.time())
-        txs = (s.query(Transaction)
-               .filter(Transaction.customer_id == cust.id,
-                       Transaction.created_at >= start_dt,
-                       Transaction.created_at <= end_dt)
-               .order_by(Transaction.created_at.asc()).all())
-        pdf_path = build_invoice_pdf(cust, txs, invoice_type="Dagafrekening", target_date=target_date)
-
-        @after_this_request
-        def cleanup(response):
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
-            return response
-
-        return send_file(str(pdf_path), mimetype="application/pdf", as_attachment=True,
+        filters = (
+            Transaction.customer_id == cust.id,
+            Transaction.created_at >= start_dt,
+            Transaction.created_at <= end_dt,
+        )
+        last_id, tx_count = s.query(func.max(Transaction.id), func.count(Transaction.id)).filter(*filters).one()
+        pdf = cached_invoice_pdf(
+            cust,
+            lambda: (s.query(Transaction)
+                     .filter(*filters, Transaction.id <= (last_id or 0))
+                     .order_by(Transaction.created_at.asc()).all()),
+            "Dagafrekening",
+            target_date,
+            last_id,
+            tx_count,
+        )
+        return send_file(pdf, mimetype="application/pdf", as_attachment=True,
                          download_name=f"Dagafrekening_{cust.number}_{target_date}.pdf")
     finally:
         s.close()
@@ -1093,27 +2368,104 @@ def invoice_final():
         cust = get_customer_by_identifier(s, customer_identifier)
         if not cust:
             return jsonify({"error": "Customer not found"}), 404
-        txs = (s.query(Transaction)
-               .filter(Transaction.customer_id == cust.id)
-               .order_by(Transaction.created_at.asc()).all())
-        pdf_path = build_invoice_pdf(cust, txs, invoice_type="Eindafrekening", target_date=date.today())
-
-        @after_this_request
-        def cleanup(response):
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
-            return response
-
-        return send_file(str(pdf_path), mimetype="application/pdf", as_attachment=True,
+        last_id, tx_count = (s.query(func.max(Transaction.id), func.count(Transaction.id))
+                             .filter(Transaction.customer_id == cust.id).one())
+        pdf = cached_invoice_pdf(
+            cust,
+            lambda: (s.query(Transaction)
+                     .filter(Transaction.customer_id == cust.id,
+                             Transaction.id <= (last_id or 0))
+                     .order_by(Transaction.created_at.asc()).all()),
+            "Eindafrekening",
+            date.today(),
+            last_id,
+            tx_count,
+        )
+        return send_file(pdf, mimetype="application/pdf", as_attachment=True,
                          download_name=f"Eindafrekening_{cust.number}.pdf")
     finally:
         s.close()
 
+@app.post("/api/invoices/final/bulk")
+@auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
+def invoice_final_bulk():
+    """Start rendering the Eindafrekening of every customer into one ZIP."""
+    s = SessionLocal()
+    try:
+        customers = s.query(
+            Customer.id, Customer.number, Customer.name, Customer.email, Customer.address
+        ).order_by(Customer.number.asc()).all()
+        rows = s.execute(
+            select(
+                Transaction.customer_id,
+                Transaction.id,
+                Transaction.created_at,
+                Transaction.product_key,
+                Transaction.tx_type,
+                Transaction.amount,
+            ).order_by(Transaction.customer_id, Transaction.created_at, Transaction.id)
+        )
+        by_customer = {
+            customer_id: [tuple(r)[1:] for r in group]
+            for customer_id, group in groupby(rows, key=lambda r: r.customer_id)
+        }
+    finally:
+        s.close()
+    work = [
+        (
+            {"number": c.number, "name": c.name, "email": c.email, "address": c.address},
+            by_customer.get(c.id, []),
+        )
+        for c in customers
+    ]
+    job = start_invoice_job(work, "Eindafrekening", date.today())
+    return jsonify(job.to_dict()), 202
+
+
+@app.get("/api/invoices/jobs/<string:job_id>")
+@auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
+def invoice_job_status(job_id):
+    job = get_invoice_job(job_id)
+    if not job:
+        return jsonify({"error": "Taak niet gevonden"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.get("/api/invoices/jobs/<string:job_id>/download")
+@auth_required(roles=["admin","medewerker"], dashboards=["facturen"])
+def invoice_job_download(job_id):
+    job = get_invoice_job(job_id)
+    if not job:
+        return jsonify({"error": "Taak niet gevonden"}), 404
+    if job.status != "finished":
+        return jsonify({"error": "Taak is nog niet klaar", **job.to_dict()}), 409
+    return send_file(str(job.path), mimetype="application/zip", as_attachment=True,
+                     download_name=job.path.name)
+
+def create_app():
+    """Return the WSGI app, bootstrapping the database unless AUTO_BOOTSTRAP=0."""
+    if AUTO_BOOTSTRAP:
+        bootstrap_database()
+    return app
+
+
+def warm_up():
+    """Load the invoice assets and open a pooled DB connection before traffic."""
+    from pdf_utils import preload_invoice_assets
+
+    preload_invoice_assets()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Beheercommando's, bijv. `python app.py rebuild-totals --verify`
+        with app.app_context():
+            app.cli.main(args=sys.argv[1:], prog_name="python app.py")
+    create_app()
     host = os.getenv("BACKEND_HOST", "0.0.0.0")
     port = int(os.getenv("BACKEND_PORT", "5000"))
-    debug_env = os.getenv("FLASK_DEBUG", "1").lower()
+    debug_env = os.getenv("FLASK_DEBUG", "0").lower()
     debug = debug_env not in {"0", "false", "no"}
     app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,44 @@
+"""Auth overhead benchmark: cost of @auth_required per call.
+
+Wraps a no-op view in auth_required (the role and dashboard checks of the
+till endpoints) and times it inside a request context with a valid Bearer
+token, once with the verified-token cache cleared before every call (a full
+jwt.decode per request, as before the cache) and once with the cache warm.
+
+    python bench/bench_auth.py
+    python bench/bench_auth.py --calls 100000
+"""
+import timeit
+
+from common import auth_headers, load_app, parser
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument("--calls", type=int, default=20000)
+    args = p.parse_args()
+    app = load_app(args.database_url)
+    headers = auth_headers(app.app.test_client())
+
+    @app.auth_required(roles=["admin", "medewerker"], dashboards=["klanten", "transacties", "munten"])
+    def view():
+        return "ok"
+
+    def uncached():
+        app.token_claims_cache.clear()
+        return view()
+
+    with app.app.test_request_context(headers=headers):
+        assert view() == "ok"
+        results = {}
+        for name, call in (("decode per call", uncached), ("cached claims", view)):
+            seconds = min(timeit.repeat(call, number=args.calls, repeat=3))
+            results[name] = seconds / args.calls * 1e6
+
+    for name, micros in results.items():
+        print(f"{name:16} {micros:7.1f} µs/call")
+    print(f"speed-up         {results['decode per call'] / results['cached claims']:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Invoice build micro-benchmark: time and allocations per PDF.
+
+Builds ``--count`` invoices (default 500) in memory with build_invoice_pdf and
+reports the time per invoice, then the tracemalloc peak and the blocks one
+build leaves allocated. By default the shared reportlab assets (stylesheet,
+paragraph styles, logo size) are built once, as in the running app; ``--cold``
+throws them away before every build, which is how every invoice was rendered
+before they were cached.
+
+    python bench/bench_invoices.py
+    python bench/bench_invoices.py --cold
+"""
+import time
+import tracemalloc
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+
+import pdf_utils
+
+PRODUCTS = ("hardcups", "champagne", "cocktail")
+
+
+def sample_invoice(lines):
+    customer = SimpleNamespace(number="02", name="The Foodystore", address="Markt 12", email="info@example.nl")
+    transactions = [
+        SimpleNamespace(
+            id=i + 1,
+            created_at=datetime(2025, 5, 1, 12, i % 60),
+            product_key=PRODUCTS[i % 3],
+            tx_type="issue" if i % 2 else "return",
+            amount=i % 7 + 1,
+        )
+        for i in range(lines)
+    ]
+    return customer, transactions
+
+
+def main():
+    p = common.parser(__doc__.splitlines()[0])
+    p.add_argument("--count", type=int, default=500)
+    p.add_argument("--lines", type=int, default=12, help="transactions per invoice")
+    p.add_argument("--cold", action="store_true", help="rebuild the shared assets for every invoice")
+    args = p.parse_args()
+    customer, transactions = sample_invoice(args.lines)
+
+    def build():
+        if args.cold:
+            pdf_utils._assets = None
+        pdf_utils.build_invoice_pdf(customer, transactions, invoice_type="Dagafrekening", target_date=date(2025, 5, 1))
+
+    build()  # imports, font metrics and (when warm) the shared assets
+    started = time.perf_counter()
+    for _ in range(args.count):
+        build()
+    elapsed = time.perf_counter() - started
+
+    # Second pass under tracemalloc, which slows Python down too much to time.
+    traced = max(1, args.count // 5)
+    tracemalloc.start()
+    for _ in range(traced):
+        build()
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot_before = tracemalloc.take_snapshot()
+    build()
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    per_build = [stat for stat in snapshot_after.compare_to(snapshot_before, "filename") if stat.size_diff > 0]
+
+    print(f"{'cold' if args.cold else 'warm'} assets, {args.count} invoices of {args.lines} lines")
+    print(f"  {elapsed / args.count * 1000:.2f} ms/invoice ({args.count / elapsed:.0f} invoices/s)")
+    print(f"  tracemalloc peak over {traced} builds: {peak / 1024:.0f} KiB")
+    print(
+        f"  left allocated by one build: {sum(s.count_diff for s in per_build)} blocks, "
+        f"{sum(s.size_diff for s in per_build) / 1024:.0f} KiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
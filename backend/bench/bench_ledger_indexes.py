@@ -0,0 +1,152 @@
+"""Ledger index benchmark: endpoint latency with and without the indexes.
+
+Seeds ``--rows`` transactions (default 1,000,000) plus coin intakes and
+consumed NFC scans, then times the endpoints that filter the ledgers on
+customer and/or created_at. Each endpoint runs once with the secondary
+indexes on transactions, coin_transactions and nfc_scans dropped ("before")
+and once with them recreated as ensure_schema does ("after"). Per endpoint
+it reports the p50/p95 of the total request and of the time spent in SQL,
+taken from the Server-Timing header.
+
+    python bench/bench_ledger_indexes.py                 # 1M rows, ~1 min
+    python bench/bench_ledger_indexes.py --rows 200000
+"""
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from common import auth_headers, load_app, parser, summary
+
+DAYS = 60
+CUSTOMERS = 300
+START = datetime(2025, 5, 1)
+PRODUCTS = ("hardcups", "champagne", "cocktail")
+SERVER_TIMING_DB = re.compile(r"db;dur=([0-9.]+)")
+
+
+def seed(app, rows, chunk=50_000):
+    rng = random.Random(1)
+    s = app.SessionLocal()
+    try:
+        s.execute(
+            insert(app.Customer.__table__),
+            [{"number": f"B{i:04d}", "name": f"Bench {i}", "nfc_code": f"BENCH{i:05d}"} for i in range(CUSTOMERS)],
+        )
+        s.commit()
+        customer_ids = [cid for (cid,) in s.query(app.Customer.id).filter(app.Customer.number.like("B%"))]
+        span = DAYS * 86400
+
+        def stamp():
+            return START + timedelta(seconds=rng.randrange(span))
+
+        for table, count, make in (
+            (app.Transaction.__table__, rows, lambda: {
+                "customer_id": rng.choice(customer_ids), "product_key": rng.choice(PRODUCTS),
+                "amount": rng.randint(1, 6), "tx_type": rng.choice(("issue", "return")), "created_at": stamp(),
+            }),
+            (app.CoinTransaction.__table__, rows // 5, lambda: {
+                "customer_id": rng.choice(customer_ids), "amount": rng.randint(1, 20), "created_at": stamp(),
+            }),
+            (app.NfcScan.__table__, rows // 10, lambda: {
+                "nfc_code": f"OLD{rng.randrange(10**6)}", "source": f"kassa-{rng.randint(1, 4)}",
+                "consumed": True, "created_at": stamp(),
+            }),
+        ):
+            for offset in range(0, count, chunk):
+                s.execute(insert(table), [make() for _ in range(min(chunk, count - offset))])
+                s.commit()
+    finally:
+        s.close()
+
+
+def ledger_indexes(app):
+    return [
+        index
+        for table in (app.Transaction.__table__, app.CoinTransaction.__table__, app.NfcScan.__table__)
+        for index in table.indexes
+    ]
+
+
+def timed(client, method, url, headers, **kwargs):
+    started = time.perf_counter()
+    response = getattr(client, method)(url, headers=headers, **kwargs)
+    total = (time.perf_counter() - started) * 1000
+    assert response.status_code in (200, 404), (url, response.status_code, response.get_data()[:200])
+    match = SERVER_TIMING_DB.search(", ".join(response.headers.getlist("Server-Timing")))
+    return total, float(match.group(1)) if match else 0.0
+
+
+def run_endpoints(app, client, headers, repeat):
+    rng = random.Random(2)
+    results = {}
+
+    def measure(name, calls):
+        totals, db = [], []
+        for call in calls:
+            total, db_ms = call()
+            totals.append(total)
+            db.append(db_ms)
+        results[name] = (totals, db)
+
+    def day():
+        return (START + timedelta(days=rng.randrange(DAYS))).date().isoformat()
+
+    def invoice():
+        app.invoice_cache.clear()
+        number = f"B{rng.randrange(CUSTOMERS):04d}"
+        return timed(client, "post", f"/api/invoices/daily?customer={number}&date={day()}", headers)
+
+    def coins_week():
+        start = START + timedelta(days=rng.randrange(DAYS - 7))
+        end = start + timedelta(days=6)
+        return timed(client, "get", f"/api/coins/daily?start={start.date()}&end={end.date()}", headers)
+
+    def customer_page():
+        number = f"B{rng.randrange(CUSTOMERS):04d}"
+        return timed(client, "get", f"/api/transactions?customer={number}&from={day()}&limit=50", headers)
+
+    def nfc_read():
+        source = f"kassa-{rng.randint(1, 4)}"
+        client.post("/api/nfc/push", json={"nfc_code": "LIVE", "source": source},
+                    headers={"X-NFC-Bridge-Token": "bench"})
+        return timed(client, "get", f"/api/nfc/read?source={source}", headers)
+
+    measure("POST /api/invoices/daily", [invoice] * repeat)
+    measure("GET  /api/coins/daily (7 dagen)", [coins_week] * repeat)
+    measure("GET  /api/transactions?customer&from", [customer_page] * repeat)
+    measure("GET  /api/nfc/read (bridge)", [nfc_read] * repeat)
+    return results
+
+
+def main():
+    p = parser(__doc__.splitlines()[0])
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--repeat", type=int, default=30)
+    args = p.parse_args()
+    app = load_app(args.database_url, NFC_MODE="bridge", NFC_BRIDGE_TOKEN="bench")
+
+    started = time.perf_counter()
+    seed(app, args.rows)
+    print(f"Seeded {args.rows:,} transactions ({app.engine.dialect.name}) in {time.perf_counter() - started:.0f}s")
+    client = app.app.test_client()
+    headers = auth_headers(client)
+
+    indexes = ledger_indexes(app)
+    for index in indexes:
+        index.drop(bind=app.engine, checkfirst=True)
+    before = run_endpoints(app, client, headers, args.repeat)
+    for index in indexes:
+        index.create(bind=app.engine, checkfirst=True)
+    after = run_endpoints(app, client, headers, args.repeat)
+
+    print(f"\n{'endpoint':38} {'before total p50/p95':>22} {'after total p50/p95':>22} {'SQL before':>12} {'SQL after':>12}")
+    for name in before:
+        (bt, bd), (at, ad) = before[name], after[name]
+        print(f"{name:38} {summary(bt):>22} {summary(at):>22} {sorted(bd)[len(bd) // 2]:10.2f}ms {sorted(ad)[len(ad) // 2]:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
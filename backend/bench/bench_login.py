@@ -0,0 +1,78 @@
+"""Login load vs till latency: does a burst of logins slow the tills down?
+
+Runs against a server you start yourself (gunicorn as in production, on a
+throwaway database). ``--login-threads`` loops log in as fast as they can
+while ``--till-threads`` readers poll GET /api/inventory with a short pause,
+the way a till screen refreshes. Prints logins/s and the p50/p95 inventory
+latency; compare runs before/after a change, or with --login-threads 0.
+
+    gunicorn -c gunicorn.conf.py wsgi:app &
+    python bench/bench_login.py --url http://127.0.0.1:5000
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+from common import ADMIN_LOGIN, summary
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--url", default="http://127.0.0.1:5000", help="base URL of the running server")
+    p.add_argument("--seconds", type=float, default=15)
+    p.add_argument("--login-threads", type=int, default=6)
+    p.add_argument("--till-threads", type=int, default=2)
+    p.add_argument("--till-pause", type=float, default=0.05, help="seconds between inventory reads")
+    args = p.parse_args()
+    api = args.url.rstrip("/") + "/api"
+
+    response = requests.post(api + "/auth/login", json=ADMIN_LOGIN, timeout=30)
+    response.raise_for_status()
+    headers = {"Authorization": "Bearer " + response.json()["token"]}
+
+    deadline = time.monotonic() + args.seconds
+    logins = []
+    statuses = []
+    latencies = []
+    lock = threading.Lock()
+
+    def login_loop():
+        session = requests.Session()
+        done = 0
+        while time.monotonic() < deadline:
+            status = session.post(api + "/auth/login", json=ADMIN_LOGIN, timeout=60).status_code
+            if status == 200:
+                done += 1
+            else:
+                with lock:
+                    statuses.append(status)
+        with lock:
+            logins.append(done)
+
+    def till_loop():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            session.get(api + "/inventory", headers=headers, timeout=60).raise_for_status()
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(args.till_pause)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(args.login_threads)]
+    threads += [threading.Thread(target=till_loop) for _ in range(args.till_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{args.login_threads} login loops, {args.till_threads} tills, {args.seconds:.0f}s against {args.url}")
+    print(f"  logins/s           {sum(logins) / args.seconds:7.1f}")
+    if statuses:
+        print(f"  refused logins     {len(statuses)} (status {sorted(set(statuses))})")
+    print(f"  inventory p50/p95  {summary(latencies)} over {len(latencies)} reads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Concurrent write benchmark: SQLite driver defaults vs the tuned profile.
+
+Threads post issue/return transactions through the app (POST
+/api/transaction) for a fixed time. app.py reads SQLITE_TUNING at import
+time and WAL mode sticks to the database file, so every profile runs in its
+own child process on its own fresh database. Reports commits/s, refused or
+failed requests and the p50/p95/p99 latency per profile.
+
+    python bench/bench_sqlite_writes.py
+    python bench/bench_sqlite_writes.py --threads 16 --seconds 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from common import auth_headers, load_app, percentile, summary, temp_sqlite_url
+
+PROFILES = {"defaults": "0", "tuned": "1"}
+
+
+def run_workload(threads, seconds):
+    app = load_app(temp_sqlite_url())
+    client = app.app.test_client()
+    headers = auth_headers(client)
+    client.put("/api/inventory/hardcups", json={"units": 1_000_000}, headers=headers)
+
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def writer(index):
+        till = app.app.test_client()
+        body = {"identifier": "02", "product": "hardcups", "amount": 1, "type": "issue" if index % 2 else "return"}
+        start.wait()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status = till.post("/api/transaction", json=body, headers=headers).status_code
+            except Exception as exc:  # e.g. "database is locked" after the retries
+                status = type(exc).__name__
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] += 1
+
+    deadline = time.monotonic() + seconds + 0.1
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {"latencies": latencies, "statuses": {str(k): v for k, v in statuses.items()}}
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        print(json.dumps(run_workload(args.threads, args.seconds)))
+        return
+
+    print(f"{args.threads} threads posting transactions for {args.seconds:.0f}s per profile")
+    print(f"{'profile':10} {'commits/s':>10} {'other':>16} {'p50 / p95 ms':>22} {'p99':>9}")
+    for name, tuning in PROFILES.items():
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--threads", str(args.threads), "--seconds", str(args.seconds)],
+            env=dict(os.environ, SQLITE_TUNING=tuning),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        statuses = result["statuses"]
+        ok = statuses.pop("200", 0)
+        print(
+            f"{name:10} {ok / args.seconds:10.0f} {json.dumps(statuses) if statuses else '-':>16} "
+            f"{summary(result['latencies']):>22} {percentile(result['latencies'], 99):7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Shared setup for the benchmark scripts in this directory.
+
+Each script is run from backend/ (``python bench/<script>.py --help``) and
+imports app.py against a fresh temporary SQLite database unless
+``--database-url`` points it somewhere else. Never point a benchmark at a
+production database: most of them write or seed data.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+ADMIN_LOGIN = {"username": "Tebbensj", "password": "Proefmei2026!"}
+
+
+def parser(description):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument(
+        "--database-url",
+        help="SQLAlchemy URL of a dedicated benchmark database (default: temporary SQLite file)",
+    )
+    return p
+
+
+def temp_sqlite_url(name="bench.db"):
+    return "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="hardcups-bench-"), name)
+
+
+def load_app(database_url=None, **env):
+    """Import app.py against ``database_url`` and bootstrap the schema.
+
+    ``env`` values are set before the import, because app.py reads its
+    configuration at import time.
+    """
+    os.environ["DATABASE_URL"] = database_url or temp_sqlite_url()
+    os.environ["AUTO_BOOTSTRAP"] = "0"
+    os.environ.setdefault("SLOW_REQUEST_MS", "0")
+    for key, value in env.items():
+        os.environ[key] = str(value)
+    import app
+
+    app.bootstrap_database()
+    return app
+
+
+def auth_headers(client):
+    response = client.post("/api/auth/login", json=ADMIN_LOGIN)
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summary(values):
+    """'p50 / p95' of a list of milliseconds."""
+    if not values:
+        return "-"
+    return f"{statistics.median(values):7.2f} / {percentile(values, 95):7.2f} ms"
@@ -0,0 +1,49 @@
+"""Locust load test: tills reading stock/customers/dashboard and booking returns.
+
+Start the server the way you want to measure it (``../start_server.sh``,
+``gunicorn -c gunicorn.conf.py wsgi:app``, ``python wsgi.py`` or
+``FLASK_DEBUG=1 python app.py``) against a throwaway database, then:
+
+    locust -f bench/locustfile.py --headless -u 32 -r 32 -t 20s \\
+        -H http://127.0.0.1:5000 --only-summary
+
+Locust itself is not a backend dependency: ``pip install locust``.
+Credentials default to the bootstrap admin; override with LOCUST_USERNAME
+and LOCUST_PASSWORD.
+"""
+import os
+
+from locust import HttpUser, between, task
+
+USERNAME = os.getenv("LOCUST_USERNAME", "Tebbensj")
+PASSWORD = os.getenv("LOCUST_PASSWORD", "Proefmei2026!")
+CUSTOMER = os.getenv("LOCUST_CUSTOMER", "02")
+
+
+class Till(HttpUser):
+    # No think time: every user keeps one request in flight.
+    wait_time = between(0, 0)
+
+    def on_start(self):
+        response = self.client.post("/api/auth/login", json={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+        self.client.headers["Authorization"] = "Bearer " + response.json()["token"]
+
+    @task(3)
+    def inventory(self):
+        self.client.get("/api/inventory")
+
+    @task(2)
+    def customers(self):
+        self.client.get("/api/customers")
+
+    @task(1)
+    def dashboard(self):
+        self.client.get("/api/dashboard")
+
+    @task(1)
+    def book_return(self):
+        self.client.post(
+            "/api/transaction",
+            json={"identifier": CUSTOMER, "product": "hardcups", "amount": 1, "type": "return"},
+        )
@@ -1,37 +1,282 @@
 import csv
+import importlib.util
+import io
+import json
 from datetime import datetime
-from typing import Any, Type
+from typing import Any, Iterator, Optional, Type
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from path_utils import ensure_output_dir
+# Rows fetched per round trip; with yield_per the driver uses a server-side
+# cursor where available, so memory stays flat regardless of table size.
+EXPORT_BATCH_SIZE = 1000
+# Rows per Parquet row group: the export buffers fetched batches until a group
+# is full (a few MB of memory) instead of writing one group per batch.
+PARQUET_ROW_GROUP_SIZE = 128 * 1024
+
+
+def _csv_chunks(header, batches) -> Iterator[str]:
+    buffer = io.StringIO()
+    w = csv.writer(buffer)
+    w.writerow(header)
+    for rows in batches:
+        w.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ledger_filters(
+    model: Type[Any],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    customer_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+) -> list:
+    """WHERE clauses shared by the ledger exports (all bounds optional)."""
+    clauses = []
+    if customer_id is not None:
+        clauses.append(model.customer_id == customer_id)
+    if start is not None:
+        clauses.append(model.created_at >= start)
+    if end is not None:
+        clauses.append(model.created_at <= end)
+    if since_id is not None:
+        clauses.append(model.id > since_id)
+    if until_id is not None:
+        clauses.append(model.id <= until_id)
+    return clauses
+
+
+def last_ledger_id(
+    session: Session, model: Type[Any], settled_before: Optional[datetime] = None, **filters
+) -> Optional[int]:
+    """Highest id an export with these filters may safely contain.
+
+    Ids are handed out at INSERT, so on MySQL a lower id can still commit
+    after a higher one was exported; a ``since_id`` sync would then skip it
+    for good. Only rows created before ``settled_before`` count, which keeps
+    the high-water mark of such syncs behind writes that may still be in
+    flight.
+    """
+    clauses = ledger_filters(model, **filters)
+    if settled_before is not None:
+        clauses.append(model.created_at <= settled_before)
+    # Walk an index from the top instead of aggregating the whole range:
+    # the primary key for incremental syncs, created_at otherwise.
+    if filters.get("since_id") is not None:
+        order = (model.id.desc(),)
+    else:
+        order = (model.created_at.desc(), model.id.desc())
+    return session.execute(select(model.id).where(*clauses).order_by(*order).limit(1)).scalar()
+
 
 def export_transactions_csv(
     session: Session,
     transaction_model: Type[Any],
     customer_model: Type[Any],
-):
-    output_dir = ensure_output_dir()
-    path = output_dir / f"transacties_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-    q = (
-        session.query(transaction_model, customer_model)
+    **filters,
+) -> Iterator[str]:
+    """Yield the transactions ledger as CSV text, one chunk per batch.
+
+    ``filters`` are passed to :func:`ledger_filters`. Incremental exports
+    (``since_id``) are ordered by id so they follow the primary key.
+    """
+    order = (
+        transaction_model.id.asc()
+        if filters.get("since_id") is not None
+        else transaction_model.created_at.asc()
+    )
+    stmt = (
+        select(
+            transaction_model.created_at,
+            customer_model.number,
+            customer_model.name,
+            transaction_model.product_key,
+            transaction_model.tx_type,
+            transaction_model.amount,
+        )
         .join(customer_model, transaction_model.customer_id == customer_model.id)
-        .order_by(transaction_model.created_at.asc())
+        .where(*ledger_filters(transaction_model, **filters))
+        .order_by(order)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    batches = (
+        [
+            (created_at.strftime("%Y-%m-%d %H:%M"), number, name, product, tx_type, amount)
+            for created_at, number, name, product, tx_type, amount in partition
+        ]
+        for partition in session.execute(stmt).partitions()
+    )
+    yield from _csv_chunks(
+        ["datetime","customer_number","customer_name","product","type","amount"], batches
+    )
+
+
+# Column name -> Arrow type for the columnar ledger exports.
+TRANSACTION_LEDGER_COLUMNS = [
+    ("id", "int64"),
+    ("created_at", "timestamp"),
+    ("customer_id", "int64"),
+    ("customer_number", "string"),
+    ("customer_name", "string"),
+    ("product", "string"),
+    ("type", "string"),
+    ("amount", "int64"),
+]
+COIN_LEDGER_COLUMNS = [
+    ("id", "int64"),
+    ("created_at", "timestamp"),
+    ("customer_id", "int64"),
+    ("customer_number", "string"),
+    ("customer_name", "string"),
+    ("amount", "int64"),
+    ("recorded_by", "string"),
+]
+
+
+def transactions_ledger_select(transaction_model: Type[Any], customer_model: Type[Any], **filters):
+    return (
+        select(
+            transaction_model.id,
+            transaction_model.created_at,
+            transaction_model.customer_id,
+            customer_model.number,
+            customer_model.name,
+            transaction_model.product_key,
+            transaction_model.tx_type,
+            transaction_model.amount,
+        )
+        .join(customer_model, transaction_model.customer_id == customer_model.id)
+        .where(*ledger_filters(transaction_model, **filters))
+        .order_by(transaction_model.id.asc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def coins_ledger_select(coin_model: Type[Any], customer_model: Type[Any], **filters):
+    return (
+        select(
+            coin_model.id,
+            coin_model.created_at,
+            coin_model.customer_id,
+            customer_model.number,
+            customer_model.name,
+            coin_model.amount,
+            coin_model.recorded_by,
+        )
+        .join(customer_model, coin_model.customer_id == customer_model.id)
+        .where(*ledger_filters(coin_model, **filters))
+        .order_by(coin_model.id.asc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def export_ledger_ndjson(session: Session, stmt, columns) -> Iterator[str]:
+    """Yield one JSON object per ledger row, newline-delimited."""
+    names = [name for name, _ in columns]
+    for partition in session.execute(stmt).partitions():
+        yield "".join(
+            json.dumps(
+                {
+                    name: value.isoformat() if isinstance(value, datetime) else value
+                    for name, value in zip(names, row)
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+            for row in partition
+        )
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_ledger_arrow(session: Session, stmt, columns, fmt: str = "parquet") -> Iterator[bytes]:
+    """Yield the ledger as a Parquet file or Arrow IPC stream. Requires the
+    optional ``pyarrow`` package.
+
+    The IPC stream gets one record batch per fetched partition. Parquet
+    buffers the batches up to PARQUET_ROW_GROUP_SIZE rows per row group,
+    because many tiny row groups bloat the footer and slow down readers."""
+    import pyarrow as pa
+
+    types = {"int64": pa.int64(), "string": pa.string(), "timestamp": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    parquet = fmt == "parquet"
+    if parquet:
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    pending, pending_rows = [], 0
+    for partition in session.execute(stmt).partitions():
+        arrays = list(zip(*partition))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(arrays, schema)],
+            schema=schema,
+        )
+        if not parquet:
+            writer.write_batch(batch)
+        else:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows < PARQUET_ROW_GROUP_SIZE:
+                continue
+            table = pa.Table.from_batches(pending, schema=schema)
+            writer.write_table(table.slice(0, PARQUET_ROW_GROUP_SIZE), row_group_size=PARQUET_ROW_GROUP_SIZE)
+            rest = table.slice(PARQUET_ROW_GROUP_SIZE)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    if pending_rows:
+        writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=PARQUET_ROW_GROUP_SIZE)
+    writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def export_inventory_csv(session: Session, inventory_model: Type[Any]) -> Iterator[str]:
+    stmt = select(
+        inventory_model.product_key, inventory_model.product_name, inventory_model.units
     )
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["datetime","customer_number","customer_name","product","type","amount"])
-        for t,c in q.all():
-            w.writerow([t.created_at.strftime("%Y-%m-%d %H:%M"), c.number, c.name, t.product_key, t.tx_type, t.amount])
-    return str(path)
-
-def export_inventory_csv(session: Session, inventory_model: Type[Any]):
-    output_dir = ensure_output_dir()
-    path = output_dir / f"voorraad_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-    items = session.query(inventory_model).all()
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["product_key","product_name","units"])
-        for i in items:
-            w.writerow([i.product_key, i.product_name, i.units])
-    return str(path)
+    yield from _csv_chunks(["product_key","product_name","units"], [session.execute(stmt).all()])
@@ -0,0 +1,57 @@
+"""Gunicorn settings for production: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+All values can be overridden through the environment (see env.example).
+Reload code without dropping requests with `kill -HUP <master-pid>` only when
+WEB_PRELOAD=0; with the default preload a HUP reuses the already imported
+app, so deploy with `systemctl restart` (or USR2 + QUIT of the old master).
+"""
+import os
+
+bind = f"{os.getenv('BACKEND_HOST', '0.0.0.0')}:{os.getenv('BACKEND_PORT', '5000')}"
+# Only one process can open a local USB reader (NFC_MODE=hardware).
+if os.getenv("NFC_MODE", "auto").lower() == "hardware":
+    workers = 1
+else:
+    workers = int(os.getenv("WEB_WORKERS", "2"))
+# Threads per worker; long-polling NFC reads each hold one while they wait.
+threads = int(os.getenv("WEB_THREADS", "8"))
+worker_class = "gthread"
+# Import app.py once in the master so workers fork with the code, reportlab
+# and invoice assets already loaded.
+preload_app = os.getenv("WEB_PRELOAD", "1").lower() not in {"0", "false", "no"}
+# Must stay above NFC_READ_MAX_WAIT_SECONDS.
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("WEB_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+# app.py reads these to know whether NFC pushes may arrive in another worker
+# and how many threads long-polling NFC reads may hold.
+os.environ["WEB_WORKERS"] = str(workers)
+os.environ["WEB_THREADS"] = str(threads)
+
+
+def when_ready(server):
+    # app.py no longer imports reportlab; with preload, load it and the invoice
+    # assets once here so the forked workers share them.
+    if preload_app:
+        from pdf_utils import preload_invoice_assets
+
+        preload_invoice_assets()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master (bootstrap during preload) must not
+    # be shared with the children; drop them without closing the sockets.
+    from app import engine
+
+    engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    from app import warm_up
+
+    warm_up()
@@ -0,0 +1,229 @@
+"""Invoice rendering for the API: cached reprints and background bulk jobs.
+
+pdf_utils (and with it reportlab) is only imported once an invoice is actually
+rendered, so importing this module stays cheap.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterable
+
+from cache_utils import LRUCache
+from path_utils import ensure_output_dir
+
+INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", "0")) or (os.cpu_count() or 1)
+# Finished jobs (and their ZIP files) are kept this long for downloading.
+INVOICE_JOB_TTL_SECONDS = int(os.getenv("INVOICE_JOB_TTL_SECONDS", "3600"))
+INVOICE_CACHE_SIZE = int(os.getenv("INVOICE_CACHE_SIZE", "256"))
+
+# Rendered PDFs keyed on everything that influences their content, so staff
+# reprints are served without running reportlab again.
+invoice_cache = LRUCache(INVOICE_CACHE_SIZE)
+
+# Jobs started by this process. Progress is also mirrored to a small JSON file
+# in the output dir so other server workers can answer status/download calls.
+_jobs: dict[str, "InvoiceJob"] = {}
+_jobs_lock = threading.Lock()
+
+
+def _status_path(job_id: str) -> Path:
+    return ensure_output_dir() / f"invoice_job_{job_id}.json"
+
+
+def invoice_cache_key(customer, invoice_type, target_date, last_transaction_id, transaction_count):
+    """Key on the newest id *and* the row count of the invoice's transactions:
+    a late-committing row with a lower id, or a deleted row, leaves MAX(id)
+    unchanged but not COUNT(*)."""
+    fields = "\x1f".join(
+        str(getattr(customer, name) or "") for name in ("number", "name", "address", "email")
+    )
+    return (
+        customer.id,
+        invoice_type,
+        (target_date or date.today()).isoformat(),
+        last_transaction_id or 0,
+        transaction_count or 0,
+        hashlib.sha1(fields.encode("utf-8")).hexdigest(),
+    )
+
+
+def cached_invoice_pdf(
+    customer, load_transactions, invoice_type, target_date, last_transaction_id, transaction_count
+):
+    """Return the invoice as a BytesIO, rendering only on a cache miss.
+
+    ``load_transactions`` is only called on a miss and must return the rows up
+    to and including ``last_transaction_id``; ``transaction_count`` is the
+    number of those rows, read in the same query as the id.
+    """
+    key = invoice_cache_key(customer, invoice_type, target_date, last_transaction_id, transaction_count)
+    pdf = invoice_cache.get(key)
+    if pdf is None:
+        from pdf_utils import build_invoice_pdf
+
+        pdf = build_invoice_pdf(
+            customer, load_transactions(), invoice_type=invoice_type, target_date=target_date
+        ).getvalue()
+        invoice_cache.set(key, pdf)
+    return BytesIO(pdf)
+
+
+def render_invoice(customer: dict, transactions: list[tuple], invoice_type: str, target_date: date) -> bytes:
+    """Process-pool entry point: plain data in, PDF bytes out.
+
+    ``transactions`` holds ``(id, created_at, product_key, tx_type, amount)``
+    tuples so nothing ORM-bound has to be pickled.
+    """
+    from pdf_utils import build_invoice_pdf
+
+    txs = [
+        SimpleNamespace(id=tx_id, created_at=created_at, product_key=product_key, tx_type=tx_type, amount=amount)
+        for tx_id, created_at, product_key, tx_type, amount in transactions
+    ]
+    return build_invoice_pdf(
+        SimpleNamespace(**customer), txs, invoice_type=invoice_type, target_date=target_date
+    ).getvalue()
+
+
+class InvoiceJob:
+    def __init__(self, total: int, invoice_type: str):
+        self.id = uuid.uuid4().hex
+        self.invoice_type = invoice_type
+        self.total = total
+        self.done = 0
+        self.failed: list[dict[str, Any]] = []
+        self.status = "queued"
+        self.error: str | None = None
+        self.path: Path | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "invoice_type": self.invoice_type,
+                "total": self.total,
+                "done": self.done,
+                "failed": list(self.failed),
+                "error": self.error,
+                "elapsed_seconds": round((self.finished_at or time.time()) - self.created_at, 2),
+            }
+
+    def _publish(self) -> None:
+        data = self.to_dict()
+        data["path"] = str(self.path) if self.path else None
+        target = _status_path(self.id)
+        tmp = target.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, target)
+
+    def _run(self, work: list[tuple[dict, list[tuple]]], target_date: date) -> None:
+        with self._lock:
+            self.status = "running"
+        path = ensure_output_dir() / f"{self.invoice_type}_{target_date:%Y%m%d}_{self.id}.zip"
+        try:
+            # "spawn" keeps the workers free of the parent's DB connections and
+            # request threads; they only import pdf_utils.
+            context = multiprocessing.get_context("spawn")
+            workers = max(1, min(INVOICE_WORKERS, len(work)))
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, zipfile.ZipFile(
+                path, "w", compression=zipfile.ZIP_STORED
+            ) as archive:
+                futures = {
+                    pool.submit(render_invoice, customer, txs, self.invoice_type, target_date): customer
+                    for customer, txs in work
+                }
+                for future in as_completed(futures):
+                    customer = futures[future]
+                    try:
+                        archive.writestr(f"{self.invoice_type}_{customer['number']}.pdf", future.result())
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as exc:  # one bad customer should not sink the batch
+                        with self._lock:
+                            self.failed.append({"number": customer["number"], "error": str(exc)})
+                    with self._lock:
+                        self.done += 1
+                    self._publish()
+        except Exception as exc:
+            path.unlink(missing_ok=True)
+            with self._lock:
+                self.status = "failed"
+                self.error = str(exc)
+                self.finished_at = time.time()
+            self._publish()
+            return
+        with self._lock:
+            self.path = path
+            self.status = "finished"
+            self.finished_at = time.time()
+        self._publish()
+
+
+class _PublishedJob:
+    """Read-only view of a job that was started by another worker process."""
+
+    def __init__(self, data: dict[str, Any]):
+        self._data = data
+        self.id = data["job_id"]
+        self.status = data["status"]
+        self.path = Path(data["path"]) if data.get("path") else None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {k: v for k, v in self._data.items() if k != "path"}
+
+
+def _expire_jobs() -> None:
+    cutoff = time.time() - INVOICE_JOB_TTL_SECONDS
+    with _jobs_lock:
+        expired = [job for job in _jobs.values() if job.finished_at and job.finished_at < cutoff]
+        for job in expired:
+            del _jobs[job.id]
+    for job in expired:
+        if job.path:
+            job.path.unlink(missing_ok=True)
+        _status_path(job.id).unlink(missing_ok=True)
+
+
+def start_invoice_job(
+    work: Iterable[tuple[dict, list[tuple]]], invoice_type: str, target_date: date
+) -> InvoiceJob:
+    """Start rendering ``(customer, transactions)`` pairs in the background."""
+    _expire_jobs()
+    work = list(work)
+    job = InvoiceJob(len(work), invoice_type)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    job._publish()
+    threading.Thread(target=job._run, args=(work, target_date), daemon=True, name=f"invoice-job-{job.id[:8]}").start()
+    return job
+
+
+def get_invoice_job(job_id: str) -> InvoiceJob | _PublishedJob | None:
+    _expire_jobs()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    if not job_id.isalnum():
+        return None
+    try:
+        return _PublishedJob(json.loads(_status_path(job_id).read_text(encoding="utf-8")))
+    except (OSError, ValueError, KeyError):
+        return None
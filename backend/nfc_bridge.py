@@ -7,6 +7,11 @@ following environment variables before running the script:
 - NFC_BRIDGE_API: Base URL of the backend, e.g. https://your-app.onrailway.app/api
 - NFC_BRIDGE_TOKEN: Secret token that must match the server's NFC_BRIDGE_TOKEN
 - NFC_BRIDGE_SOURCE: Optional human-readable name (e.g. "kassa-1")
+- NFC_BRIDGE_QUEUE: Optional path of the local scan buffer (SQLite file)
+
+Scans are first written to the local buffer and uploaded in batches by a
+background thread, so a flaky uplink delays scans instead of losing them or
+stalling the reader. Unsent scans survive a restart of the bridge.
 
 Install dependencies locally:
     pip install nfcpy requests python-dotenv
@@ -16,55 +21,196 @@ Then run:
 """
 
 import os
+import random
+import sqlite3
 import sys
+import threading
 import time
 
 import requests
 from dotenv import load_dotenv
 
-try:
-    import nfc
-except ImportError as exc:  # pragma: no cover - helper script only
-    raise SystemExit("nfcpy is vereist om deze bridge te gebruiken: pip install nfcpy") from exc
-
 load_dotenv()
 
 API_BASE = os.getenv("NFC_BRIDGE_API")
 BRIDGE_TOKEN = os.getenv("NFC_BRIDGE_TOKEN")
 SOURCE = os.getenv("NFC_BRIDGE_SOURCE", "bridge-client")
 POLL_DELAY = float(os.getenv("NFC_BRIDGE_POLL_DELAY", "0.5"))
-
-if not API_BASE or not BRIDGE_TOKEN:
-    raise SystemExit("Stel NFC_BRIDGE_API en NFC_BRIDGE_TOKEN in voordat je de bridge start.")
-
-PUSH_URL = API_BASE.rstrip("/") + "/nfc/push"
-
-
-def push_code(code: str) -> None:
-    payload = {"nfc_code": code, "source": SOURCE}
-    headers = {"X-NFC-Bridge-Token": BRIDGE_TOKEN}
-    response = requests.post(PUSH_URL, json=payload, headers=headers, timeout=10)
-    response.raise_for_status()
-    data = response.json()
-    timestamp = data.get("received_at")
-    print(f"[{timestamp}] NFC-code doorgestuurd: {code}")
+QUEUE_PATH = os.getenv(
+    "NFC_BRIDGE_QUEUE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nfc_bridge_queue.db")
+)
+BATCH_SIZE = int(os.getenv("NFC_BRIDGE_BATCH_SIZE", "50"))
+REQUEST_TIMEOUT = float(os.getenv("NFC_BRIDGE_TIMEOUT", "5"))
+MAX_BACKOFF = float(os.getenv("NFC_BRIDGE_MAX_BACKOFF", "60"))
+
+
+class ScanQueue:
+    """Scans waiting for upload, kept in a small SQLite file."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, nfc_code TEXT NOT NULL, "
+            "source TEXT NOT NULL, scanned_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def put(self, code: str, source: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending (nfc_code, source, scanned_at) VALUES (?, ?, ?)",
+                (code, source, time.time()),
+            )
+            self._conn.commit()
+
+    def peek(self, limit: int) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, nfc_code, source, scanned_at FROM pending ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+    def remove(self, ids) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+
+class Uploader(threading.Thread):
+    """Background thread that drains the queue with retries and backoff.
+
+    A batch the server refuses with 400 is split in halves and retried, so a
+    batch above the server's NFC_PUSH_BATCH_MAX still gets through and one bad
+    scan cannot take valid ones down with it. Only a scan refused on its own
+    is dropped from the buffer.
+    """
+
+    def __init__(self, queue: ScanQueue, api_base: str, token: str, batch_size: int = BATCH_SIZE):
+        super().__init__(daemon=True, name="nfc-uploader")
+        self.queue = queue
+        self.batch_url = api_base.rstrip("/") + "/nfc/push/batch"
+        self.push_url = api_base.rstrip("/") + "/nfc/push"
+        self.http = requests.Session()  # keep-alive across uploads
+        self.http.headers["X-NFC-Bridge-Token"] = token
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.batch_supported = True
+        self.batch_size = max(1, batch_size)
+
+    def notify(self) -> None:
+        self.wakeup.set()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.wakeup.set()
+
+    def _send(self, rows) -> None:
+        now = time.time()
+        scans = [
+            {"nfc_code": code, "source": source, "age_seconds": round(max(0.0, now - scanned_at), 3)}
+            for _, code, source, scanned_at in rows
+        ]
+        if self.batch_supported:
+            response = self.http.post(self.batch_url, json={"scans": scans}, timeout=REQUEST_TIMEOUT)
+            if response.status_code != 404:
+                response.raise_for_status()
+                return
+            # Older servers (e.g. the PHP backend) only have the single push.
+            self.batch_supported = False
+        for scan in scans:
+            self.http.post(self.push_url, json=scan, timeout=REQUEST_TIMEOUT).raise_for_status()
+
+    def _deliver(self, rows):
+        """Send ``rows``, splitting on 400; return (largest accepted batch, dropped)."""
+        try:
+            self._send(rows)
+        except requests.HTTPError as exc:
+            if exc.response.status_code != 400:
+                raise
+            if len(rows) == 1:
+                print(f"Scan {rows[0][1]} geweigerd door server, overgeslagen: {exc}", file=sys.stderr)
+                self.queue.remove([rows[0][0]])
+                return 0, 1
+            half = len(rows) // 2
+            first = self._deliver(rows[:half])
+            second = self._deliver(rows[half:])
+            return max(first[0], second[0]), first[1] + second[1]
+        self.queue.remove([row[0] for row in rows])
+        for _, code, _, _ in rows:
+            print(f"NFC-code doorgestuurd: {code}")
+        return len(rows), 0
+
+    def run(self) -> None:
+        backoff = 0.0
+        while not self.stopping.is_set():
+            rows = self.queue.peek(self.batch_size if self.batch_supported else 1)
+            if not rows:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            try:
+                accepted, dropped = self._deliver(rows)
+            except requests.RequestException as exc:
+                error = exc
+            else:
+                if accepted < len(rows) and not dropped:
+                    # Every scan was fine, so the batch was too large for the
+                    # server: stay at the size it accepted.
+                    self.batch_size = accepted
+                    print(
+                        f"Batch te groot voor de server; verder met {accepted} scans per batch",
+                        file=sys.stderr,
+                    )
+                backoff = 0.0
+                continue
+            backoff = min(MAX_BACKOFF, backoff * 2 if backoff else 1.0)
+            delay = backoff * (0.5 + random.random() / 2)
+            print(
+                f"Upload mislukt ({error}); {len(self.queue)} scan(s) in buffer, "
+                f"nieuwe poging over {delay:.1f}s",
+                file=sys.stderr,
+            )
+            self.stopping.wait(delay)
 
 
 def main() -> None:
+    if not API_BASE or not BRIDGE_TOKEN:
+        raise SystemExit("Stel NFC_BRIDGE_API en NFC_BRIDGE_TOKEN in voordat je de bridge start.")
+    try:
+        import nfc
+    except ImportError as exc:  # pragma: no cover - helper script only
+        raise SystemExit("nfcpy is vereist om deze bridge te gebruiken: pip install nfcpy") from exc
+
+    queue = ScanQueue(QUEUE_PATH)
+    uploader = Uploader(queue, API_BASE, BRIDGE_TOKEN)
+    uploader.start()
+    if len(queue):
+        print(f"{len(queue)} scan(s) uit eerdere sessie worden alsnog verstuurd.")
     print(f"Verbinding maken met NFC-lezer (bron='{SOURCE}')...")
-    with nfc.ContactlessFrontend("usb") as clf:
-        print("Bridge actief. Houd een tag bij de lezer om te scannen (Ctrl+C om te stoppen).")
-        try:
-            while True:
-                tag = clf.connect(rdwr={"on-connect": lambda tag: False})
-                code = tag.identifier.hex()
-                push_code(code)
-                time.sleep(POLL_DELAY)
-        except KeyboardInterrupt:
-            print("\nBridge gestopt op verzoek van gebruiker.")
-        except Exception as exc:
-            print(f"Fout bij het lezen van NFC: {exc}", file=sys.stderr)
-            raise
+    try:
+        while True:
+            try:
+                with nfc.ContactlessFrontend("usb") as clf:
+                    print("Bridge actief. Houd een tag bij de lezer om te scannen (Ctrl+C om te stoppen).")
+                    while True:
+                        tag = clf.connect(rdwr={"on-connect": lambda tag: False})
+                        queue.put(tag.identifier.hex(), SOURCE)
+                        uploader.notify()
+                        time.sleep(POLL_DELAY)
+            except (IOError, OSError) as exc:
+                print(f"Fout bij het lezen van NFC: {exc}; opnieuw verbinden...", file=sys.stderr)
+                time.sleep(2)
+    except KeyboardInterrupt:
+        print("\nBridge gestopt op verzoek van gebruiker.")
+    finally:
+        uploader.stop()
+        uploader.join(timeout=REQUEST_TIMEOUT)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""Long-lived USB NFC reader owned by a background thread.
+
+Opening ``nfc.ContactlessFrontend`` costs a USB setup per call and, on servers
+without a reader, a failing import/open on every request. The manager opens
+the device once, keeps reading tags into a small in-memory queue and remembers
+when no reader is present, probing again every ``reprobe_seconds``.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+NFC_READER_REPROBE_SECONDS = float(os.getenv("NFC_READER_REPROBE_SECONDS", "60"))
+NFC_READER_DEBOUNCE_SECONDS = float(os.getenv("NFC_READER_DEBOUNCE_SECONDS", "1.0"))
+
+
+class NfcpyBackend:
+    """Reader backend on top of nfcpy; ``read`` blocks until a tag or terminate."""
+
+    def __init__(self, device: str = "usb"):
+        import nfc  # requires nfcpy
+
+        self._clf = nfc.ContactlessFrontend(device)
+
+    def read(self, terminate: Callable[[], bool]) -> Optional[str]:
+        tag = self._clf.connect(rdwr={"on-connect": lambda tag: False}, terminate=terminate)
+        return tag.identifier.hex() if tag else None
+
+    def close(self) -> None:
+        self._clf.close()
+
+
+class ReaderManager:
+    """Owns one reader backend in a daemon thread and queues the tags it reads.
+
+    ``open_backend`` returns an object with ``read(terminate)`` and ``close()``;
+    it raises when no reader is available. Tests pass a fake here.
+    """
+
+    def __init__(
+        self,
+        open_backend: Callable[[], object] = NfcpyBackend,
+        reprobe_seconds: float = NFC_READER_REPROBE_SECONDS,
+        max_age_seconds: float = 30,
+        debounce_seconds: float = NFC_READER_DEBOUNCE_SECONDS,
+    ):
+        self.open_backend = open_backend
+        self.reprobe_seconds = reprobe_seconds
+        self.max_age_seconds = max_age_seconds
+        self.debounce_seconds = debounce_seconds
+        self.available = False
+        self.last_error: Optional[str] = None
+        self._tags: deque[tuple[float, str]] = deque(maxlen=32)
+        self._last_read: tuple[Optional[str], float] = (None, 0.0)
+        self._cond = threading.Condition()
+        self._probed = threading.Event()
+        self._stop = threading.Event()
+        self._pid: Optional[int] = None
+
+    def start(self, probe_timeout: float = 2.0) -> None:
+        """Start the reader thread once per process and wait for the first probe."""
+        with self._cond:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._probed.clear()
+                self._stop.clear()
+                threading.Thread(target=self._run, daemon=True, name="nfc-reader").start()
+        self._probed.wait(probe_timeout)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def read(self, timeout: float = 0) -> Optional[str]:
+        """Return the oldest fresh tag, waiting up to ``timeout`` seconds for one."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                cutoff = time.monotonic() - self.max_age_seconds
+                while self._tags:
+                    read_at, code = self._tags.popleft()
+                    if read_at >= cutoff:
+                        return code
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.available:
+                    return None
+                self._cond.wait(remaining)
+
+    def _publish(self, code: str) -> None:
+        now = time.monotonic()
+        with self._cond:
+            # A tag held against the reader is reported on every connect; only
+            # queue it again once it has been away for debounce_seconds.
+            last_code, last_seen = self._last_read
+            self._last_read = (code, now)
+            if code == last_code and now - last_seen < self.debounce_seconds:
+                return
+            self._tags.append((now, code))
+            self._cond.notify_all()
+
+    def _set_state(self, available: bool, error: Optional[str] = None) -> None:
+        with self._cond:
+            self.available = available
+            self.last_error = error
+            self._cond.notify_all()
+        self._probed.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                backend = self.open_backend()
+            except Exception as exc:  # no reader (or nfcpy missing): try again later
+                self._set_state(False, str(exc))
+                self._stop.wait(self.reprobe_seconds)
+                continue
+            self._set_state(True)
+            try:
+                while not self._stop.is_set():
+                    code = backend.read(self._stop.is_set)
+                    if code:
+                        self._publish(code)
+            except Exception as exc:  # reader unplugged or USB error
+                self._set_state(False, str(exc))
+            finally:
+                try:
+                    backend.close()
+                except Exception:
+                    pass
+            if not self._stop.is_set():
+                self._stop.wait(self.reprobe_seconds)
@@ -1,27 +1,24 @@
 # Business Pro Forma PDF (with watermark)
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.utils import ImageReader
+from reportlab import rl_config
 from reportlab.lib import colors
 from reportlab.lib.units import mm
-from datetime import datetime
-import random, os
+from datetime import date, datetime
+import os
 from pathlib import Path
 import tempfile
+import threading
+from io import BytesIO
 
 OUTPUT_DIR_ENV = "INVOICE_OUTPUT_DIR"
 
-from path_utils import ensure_output_dir
-
-from path_utils import ensure_output_dir
-
-from path_utils import ensure_output_dir
-
-from path_utils import ensure_output_dir
-
-from path_utils import ensure_output_dir
-
-from path_utils import ensure_output_dir
+# Embed streams (logo JPEG, page content) as binary instead of ASCII85 text.
+# The pure-Python ASCII85 encoder was the largest per-invoice cost (re-encoding
+# the logo for every PDF) and the output is a valid, smaller PDF.
+rl_config.useA85 = 0
 
 PRIMARY = colors.HexColor("#002b5b")
 LIGHT_BG = colors.HexColor("#f7f9fc")
@@ -29,6 +26,85 @@ TEXT = colors.black
 
 LOGO_PATH = os.path.join(os.path.dirname(__file__), "..", "frontend", "logo.jpeg")
 
+DETAILS_TABLE_STYLE = TableStyle([
+    ("BOX", (0,0), (-1,-1), 0.25, colors.HexColor("#dde6ef")),
+    ("BACKGROUND", (0,0), (-1,0), LIGHT_BG),
+    ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+    ("INNERGRID", (0,0), (-1,-1), 0.25, colors.HexColor("#e5edf6")),
+    ("LEFTPADDING", (0,0), (-1,-1), 6),
+    ("RIGHTPADDING", (0,0), (-1,-1), 6),
+    ("TOPPADDING", (0,0), (-1,-1), 6),
+    ("BOTTOMPADDING", (0,0), (-1,-1), 6),
+])
+HEAD_TABLE_STYLE = TableStyle([("ALIGN", (1,0), (1,0), "RIGHT"), ("VALIGN", (0,0), (-1,-1), "MIDDLE")])
+TOTALS_TABLE_STYLE = TableStyle([
+    ("BACKGROUND",(0,0),(-1,0),LIGHT_BG),
+    ("BOX",(0,0),(-1,-1),0.25,colors.HexColor("#dde6ef")),
+    ("LEFTPADDING",(0,0),(-1,-1),6),
+    ("RIGHTPADDING",(0,0),(-1,-1),6),
+    ("TOPPADDING",(0,0),(-1,-1),6),
+    ("BOTTOMPADDING",(0,0),(-1,-1),6),
+])
+TRANSACTIONS_BASE_STYLE = [
+    ("BACKGROUND",(0,0),(-1,0),PRIMARY),
+    ("TEXTCOLOR",(0,0),(-1,0),colors.white),
+    ("FONTNAME",(0,0),(-1,0),"Helvetica-Bold"),
+    ("ALIGN",(-1,1),(-1,-1),"RIGHT"),
+    ("VALIGN",(0,0),(-1,-1),"MIDDLE"),
+    ("INNERGRID",(0,0),(-1,-1),0.25,colors.HexColor("#e0e6ee")),
+    ("BOX",(0,0),(-1,-1),0.5,colors.HexColor("#c9d2de")),
+]
+
+# Invariant assets, loaded on first use and shared by every invoice build.
+# Flowables themselves are still created per build: reportlab stores layout
+# state on them, so they cannot be shared between (concurrent) documents.
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def _load_assets():
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                styles = getSampleStyleSheet()
+                logo_size = None
+                if os.path.exists(LOGO_PATH):
+                    width, height = ImageReader(LOGO_PATH).getSize()
+                    scale = min(1.0, (60 * mm) / width, (25 * mm) / height)
+                    logo_size = (width * scale, height * scale)
+                _assets = {
+                    "styles": styles,
+                    "title": ParagraphStyle("title", parent=styles["Heading1"], textColor=PRIMARY),
+                    "small": ParagraphStyle("small", parent=styles["BodyText"], fontSize=10),
+                    "small_bold_blue": ParagraphStyle("sbb", parent=styles["BodyText"], fontSize=10, textColor=PRIMARY),
+                    "logo_size": logo_size,
+                }
+    return _assets
+
+
+def preload_invoice_assets():
+    """Build the shared styles and logo metadata ahead of the first invoice."""
+    _load_assets()
+
+
+class _Logo(Flowable):
+    """Logo sized once in _load_assets instead of re-reading the JPEG header per
+    invoice. Drawn by path so reportlab embeds the JPEG bytes as-is."""
+
+    def __init__(self, path, width, height):
+        Flowable.__init__(self)
+        self.path = path
+        self.drawWidth = width
+        self.drawHeight = height
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(self.path, 0, 0, self.drawWidth, self.drawHeight, mask="auto")
+
+
 def _company_info_paragraph(styles):
     return Paragraph("""<b>ProefMei B.V.</b><br/>
 Lombardenstraat 19<br/>
@@ -38,18 +114,17 @@ BTW: NL001234567B01<br/>
 IBAN: NL00BANK0123456789""", styles["Normal"])
 
 def _header(story, title_text, print_date, styles):
-    if os.path.exists(LOGO_PATH):
-        logo_flow = Image(LOGO_PATH)
-        logo_flow._restrictSize(60 * mm, 25 * mm)
+    assets = _load_assets()
+    if assets["logo_size"]:
+        logo_flow = _Logo(LOGO_PATH, *assets["logo_size"])
     else:
         logo_flow = Paragraph("", styles["Normal"])
     head_table = Table([[logo_flow, _company_info_paragraph(styles)]], colWidths=[60*mm, 110*mm])
-    head_table.setStyle(TableStyle([("ALIGN", (1,0), (1,0), "RIGHT"), ("VALIGN", (0,0), (-1,-1), "MIDDLE")]))
+    head_table.setStyle(HEAD_TABLE_STYLE)
     story.append(head_table)
     story.append(Spacer(1, 10))
 
-    title_style = ParagraphStyle("title", parent=styles["Heading1"], textColor=PRIMARY)
-    story.append(Paragraph(title_text, title_style))
+    story.append(Paragraph(title_text, assets["title"]))
     story.append(Spacer(1, 4))
     story.append(Paragraph(f"Datum afdrukken: {print_date}", styles["Normal"]))
     story.append(Spacer(1, 10))
@@ -72,16 +147,7 @@ def _two_col_details(story, customer, invoice_no, print_date, invoice_type, styl
     lt = Table(left, colWidths=[30*mm, 60*mm])
     rt = Table(right, colWidths=[30*mm, 60*mm])
     for t in (lt, rt):
-        t.setStyle(TableStyle([
-            ("BOX", (0,0), (-1,-1), 0.25, colors.HexColor("#dde6ef")),
-            ("BACKGROUND", (0,0), (-1,0), LIGHT_BG),
-            ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-            ("INNERGRID", (0,0), (-1,-1), 0.25, colors.HexColor("#e5edf6")),
-            ("LEFTPADDING", (0,0), (-1,-1), 6),
-            ("RIGHTPADDING", (0,0), (-1,-1), 6),
-            ("TOPPADDING", (0,0), (-1,-1), 6),
-            ("BOTTOMPADDING", (0,0), (-1,-1), 6),
-        ]))
+        t.setStyle(DETAILS_TABLE_STYLE)
     container = Table([[lt, rt]], colWidths=[95*mm, 95*mm])
     story.append(container)
     story.append(Spacer(1, 10))
@@ -101,35 +167,20 @@ def _transactions_table(transactions):
         if t.tx_type=="issue": total_issue[t.product_key]+=t.amount
         else: total_return[t.product_key]+=t.amount
     table = Table(data, colWidths=[55*mm, 60*mm, 30*mm, 20*mm])
-    style=[
-        ("BACKGROUND",(0,0),(-1,0),PRIMARY),
-        ("TEXTCOLOR",(0,0),(-1,0),colors.white),
-        ("FONTNAME",(0,0),(-1,0),"Helvetica-Bold"),
-        ("ALIGN",(-1,1),(-1,-1),"RIGHT"),
-        ("VALIGN",(0,0),(-1,-1),"MIDDLE"),
-        ("INNERGRID",(0,0),(-1,-1),0.25,colors.HexColor("#e0e6ee")),
-        ("BOX",(0,0),(-1,-1),0.5,colors.HexColor("#c9d2de")),
-    ]
+    style=list(TRANSACTIONS_BASE_STYLE)
     for row in range(1,len(data)):
         if row%2==0: style.append(("BACKGROUND",(0,row),(-1,row),colors.whitesmoke))
     table.setStyle(TableStyle(style))
     return table, total_issue, total_return
 
 def _totals_block(total_issue,total_return, styles):
-    small_bold_blue = ParagraphStyle("sbb", parent=styles["BodyText"], fontSize=10, textColor=PRIMARY)
+    small_bold_blue = _load_assets()["small_bold_blue"]
     def line(label,d):
         return Paragraph(f"<b>{label}</b>: Hardcups {d['hardcups']} • Champagne {d['champagne']} • Cocktail {d['cocktail']}", small_bold_blue)
     net={k:total_issue[k]-total_return[k] for k in total_issue.keys()}
     rows=[[line("Totaal Uitgifte", total_issue)],[line("Totaal Inname", total_return)],[line("Netto (Uitgifte - Inname)", net)]]
     t=Table(rows,colWidths=[190*mm])
-    t.setStyle(TableStyle([
-        ("BACKGROUND",(0,0),(-1,0),LIGHT_BG),
-        ("BOX",(0,0),(-1,-1),0.25,colors.HexColor("#dde6ef")),
-        ("LEFTPADDING",(0,0),(-1,-1),6),
-        ("RIGHTPADDING",(0,0),(-1,-1),6),
-        ("TOPPADDING",(0,0),(-1,-1),6),
-        ("BOTTOMPADDING",(0,0),(-1,-1),6),
-    ]))
+    t.setStyle(TOTALS_TABLE_STYLE)
     return t
 
 def _footer(canvas, doc):
@@ -160,14 +211,22 @@ def _resolve_output_dir():
     return base
 
 
+def invoice_number(customer, transactions, invoice_type, target_date=None):
+    """Deterministic number: type letter, date, customer and last transaction id."""
+    last_id = max((t.id for t in transactions), default=0)
+    day = target_date or date.today()
+    return f"{invoice_type[:1].upper()}{day:%Y%m%d}-{customer.number}-{last_id:04d}"
+
+
 def build_invoice_pdf(customer, transactions, invoice_type="Afrekening", target_date=None):
-    styles = getSampleStyleSheet()
-    inv_no=f"{datetime.now().strftime('%Y%m')}-{customer.number}-{random.randint(1000,9999)}"
+    """Render the invoice into memory and return a BytesIO positioned at 0."""
+    assets = _load_assets()
+    styles = assets["styles"]
+    inv_no=invoice_number(customer, transactions, invoice_type, target_date)
     title=f"ProefMei — Pro Forma Factuur ({invoice_type})"
     print_date=(target_date.strftime('%d-%m-%Y') if target_date else datetime.now().strftime('%d-%m-%Y'))
-    output_dir = ensure_output_dir()
-    filename = output_dir / f"ProForma_{customer.number}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-    doc=SimpleDocTemplate(str(filename),pagesize=A4,leftMargin=18*mm,rightMargin=18*mm,topMargin=16*mm,bottomMargin=16*mm)
+    buffer = BytesIO()
+    doc=SimpleDocTemplate(buffer,pagesize=A4,leftMargin=18*mm,rightMargin=18*mm,topMargin=16*mm,bottomMargin=16*mm)
 
     story=[]
     logo_note = "Zorg dat frontend/logo.jpeg bestaat voor een logo bovenaan."
@@ -179,10 +238,11 @@ def build_invoice_pdf(customer, transactions, invoice_type="Afrekening", target_
     story.append(_totals_block(total_issue,total_return, styles))
     story.append(Spacer(1,14))
 
-    small=ParagraphStyle("small", parent=styles["BodyText"], fontSize=10)
+    small=assets["small"]
     story.append(Paragraph("<b>Handtekening klant:</b> ________________________________", small))
     story.append(Spacer(1,8))
     story.append(Paragraph("<b>Handtekening medewerker:</b> _________________________", small))
 
     doc.build(story, onFirstPage=_watermark, onLaterPages=_watermark)
-    return filename
+    buffer.seek(0)
+    return buffer
@@ -25,6 +25,8 @@ CREATE TABLE IF NOT EXISTS transactions (
   amount INT NOT NULL,
   tx_type ENUM('issue','return') NOT NULL,
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_transactions_customer_created (customer_id, created_at),
+  INDEX ix_transactions_created (created_at),
   CONSTRAINT fk_cust FOREIGN KEY (customer_id) REFERENCES customers(id)
 );
 
@@ -43,6 +45,7 @@ CREATE TABLE IF NOT EXISTS coin_transactions (
   amount INT NOT NULL,
   recorded_by VARCHAR(64),
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_coin_transactions_created (created_at),
   CONSTRAINT fk_coin_customer FOREIGN KEY (customer_id) REFERENCES customers(id)
 );
 
@@ -52,5 +55,32 @@ CREATE TABLE IF NOT EXISTS nfc_scans (
   source VARCHAR(64) DEFAULT NULL,
   consumed TINYINT(1) NOT NULL DEFAULT 0,
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-  consumed_at DATETIME DEFAULT NULL
+  consumed_at DATETIME DEFAULT NULL,
+  INDEX ix_nfc_scans_consumed_created (consumed, created_at),
+  INDEX ix_nfc_scans_source_consumed_created (source, consumed, created_at)
 );
+
+-- Lopende totalen per klant; bijgewerkt door /api/transaction en /api/coins/intake.
+-- Herbouwen of controleren: python app.py rebuild-totals [--verify]
+CREATE TABLE IF NOT EXISTS customer_totals (
+  customer_id INT NOT NULL,
+  product_key VARCHAR(32) NOT NULL,
+  tx_type ENUM('issue','return') NOT NULL,
+  total INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (customer_id, product_key, tx_type),
+  CONSTRAINT fk_total_customer FOREIGN KEY (customer_id) REFERENCES customers(id)
+);
+
+CREATE TABLE IF NOT EXISTS customer_coin_totals (
+  customer_id INT NOT NULL PRIMARY KEY,
+  total INT NOT NULL DEFAULT 0,
+  CONSTRAINT fk_coin_total_customer FOREIGN KEY (customer_id) REFERENCES customers(id)
+);
+
+-- Wijzigingsteller per gegevensgebied; basis voor de ETags van de leesroutes.
+CREATE TABLE IF NOT EXISTS data_versions (
+  scope VARCHAR(32) NOT NULL PRIMARY KEY,
+  version INT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO data_versions (scope, version) VALUES
+  ('customers', 0), ('inventory', 0), ('totals', 0);
@@ -0,0 +1,116 @@
+"""Password hashing off the request threads and failed-login throttling."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from cache_utils import LRUCache
+
+# Any werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# Hashes computed at the same time; scrypt/pbkdf2 release the GIL, so this is
+# roughly the number of CPU cores logins may occupy.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hashes running or waiting before new logins are turned away with a 503.
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are queued; the request should be retried."""
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+_canonical_method: Optional[str] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    # Created per process so gunicorn workers never inherit the master's pool.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = _executor().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+    except FutureTimeout:
+        raise HashingBusy() from None
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True when the stored hash was made with another method or cost."""
+    global _canonical_method
+    if _canonical_method is None:
+        # werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"); hash
+        # once to learn the exact prefix new hashes get.
+        _canonical_method = hash_password("").split("$", 1)[0]
+    return password_hash.split("$", 1)[0] != _canonical_method
+
+
+class LoginThrottle:
+    """Counts failed attempts per client IP and per username from that IP in a
+    fixed window.
+
+    The username limit is keyed on (username, ip): failures from one address
+    cannot lock the account out for clients elsewhere. State lives in each
+    server process, so with several workers the effective limit is per worker.
+    """
+
+    def __init__(self, max_per_user: int, max_per_ip: int, window_seconds: float):
+        self.max_per_user = max_per_user
+        self.max_per_ip = max_per_ip
+        self.window_seconds = window_seconds
+        self._failures = LRUCache(maxsize=10000)
+        self._lock = threading.Lock()
+
+    def _keys(self, ip: str, username: str):
+        return (("ip", ip), self.max_per_ip), (("user", (username or "").lower(), ip), self.max_per_user)
+
+    def retry_after(self, ip: str, username: str) -> Optional[int]:
+        """Seconds until this client/username may try again, or None."""
+        now = time.monotonic()
+        for key, limit in self._keys(ip, username):
+            count, started = self._failures.get(key, (0, now))
+            if limit and count >= limit:
+                return max(1, int(started + self.window_seconds - now + 0.999))
+        return None
+
+    def failed(self, ip: str, username: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, _ in self._keys(ip, username):
+                count, started = self._failures.get(key, (0, now))
+                remaining = started + self.window_seconds - now
+                self._failures.set(key, (count + 1, started), ttl=max(remaining, 0.001))
+
+    def succeeded(self, ip: str, username: str) -> None:
+        self._failures.pop(("user", (username or "").lower(), ip))
@@ -0,0 +1,60 @@
+"""Identifier -> customer cache: edits from any worker must win over cached ids."""
+import uuid
+
+from sqlalchemy import update
+
+
+def _make_customers(app_module):
+    """Two new customers with unique numbers; the first holds a new card."""
+    base = f"{uuid.uuid4().int % 10**7:07d}"
+    card = f"CARD-{base}"
+    with app_module.SessionLocal() as s:
+        a = app_module.Customer(number=f"{base}1", name="Klant A", nfc_code=card)
+        b = app_module.Customer(number=f"{base}2", name="Klant B")
+        s.add_all([a, b])
+        app_module.bump_data_version(s, "customers")
+        s.commit()
+        return a.id, b.id, card
+
+
+def _move_card(app_module, card, to_customer_id):
+    """Reassign an NFC card the way another worker would: own session, no cache clear."""
+    with app_module.SessionLocal.session_factory() as s:
+        s.execute(update(app_module.Customer).where(app_module.Customer.nfc_code == card).values(nfc_code=None))
+        s.execute(
+            update(app_module.Customer).where(app_module.Customer.id == to_customer_id).values(nfc_code=card)
+        )
+        app_module.bump_data_version(s, "customers")
+        s.commit()
+
+
+def _resolve(app_module, identifier):
+    with app_module.SessionLocal() as s:
+        return app_module.resolve_customer_id(s, identifier)
+
+
+def test_card_moved_by_another_worker_is_picked_up(app_module):
+    a, b, card = _make_customers(app_module)
+    assert _resolve(app_module, card) == a
+    assert _resolve(app_module, card) == a  # served from the cache
+
+    _move_card(app_module, card, b)
+
+    assert _resolve(app_module, card) == b
+
+
+def test_lookup_racing_an_edit_is_not_cached(app_module, monkeypatch):
+    a, b, card = _make_customers(app_module)
+    original = app_module.get_customers_by_identifiers
+
+    def lookup_then_edit(s, identifiers):
+        # The old row has been read when the edit commits.
+        found = original(s, identifiers)
+        _move_card(app_module, card, b)
+        return found
+
+    monkeypatch.setattr(app_module, "get_customers_by_identifiers", lookup_then_edit)
+    assert _resolve(app_module, card) == a
+    monkeypatch.setattr(app_module, "get_customers_by_identifiers", original)
+
+    assert _resolve(app_module, card) == b
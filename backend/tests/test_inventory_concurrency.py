@@ -0,0 +1,76 @@
+"""Stress test for the atomic issue/return path (POST /api/transaction).
+
+Several threads issue single units at the same time against a fixed stock.
+Every unit must be sold exactly once: no oversell, no lost update. The
+throughput reached is printed (see it with ``pytest -s``); run with
+DATABASE_URL set to compare SQLite and MySQL.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+STOCK = int(os.getenv("STRESS_STOCK", "200"))
+THREADS = int(os.getenv("STRESS_THREADS", "8"))
+# More attempts than stock, so the last requests must be refused.
+ATTEMPTS_PER_THREAD = (STOCK * 3 // 2) // THREADS + 1
+
+
+def _set_stock(client, headers, units):
+    response = client.put("/api/inventory/hardcups", json={"units": units}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+
+
+def _units(app_module):
+    with app_module.SessionLocal() as s:
+        return s.query(app_module.Inventory.units).filter_by(product_key="hardcups").scalar()
+
+
+def _run_threads(app_module, headers, body):
+    statuses = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def worker():
+        client = app_module.app.test_client()
+        start.wait()
+        for _ in range(ATTEMPTS_PER_THREAD):
+            response = client.post("/api/transaction", json=body, headers=headers)
+            with lock:
+                statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses, time.perf_counter() - started
+
+
+def test_concurrent_issues_never_oversell(app_module, client, auth_headers):
+    _set_stock(client, auth_headers, STOCK)
+    body = {"identifier": "02", "product": "hardcups", "amount": 1, "type": "issue"}
+
+    statuses, elapsed = _run_threads(app_module, auth_headers, body)
+
+    attempts = THREADS * ATTEMPTS_PER_THREAD
+    print(
+        f"\n[{app_module.engine.dialect.name}] {THREADS} threads, {attempts} issues in "
+        f"{elapsed:.2f}s: {attempts / elapsed:.0f} req/s, {dict(statuses)}"
+    )
+    assert statuses[200] == STOCK
+    assert statuses[400] == attempts - STOCK
+    assert _units(app_module) == 0
+
+
+def test_concurrent_returns_lose_no_updates(app_module, client, auth_headers):
+    _set_stock(client, auth_headers, 0)
+    body = {"identifier": "02", "product": "hardcups", "amount": 1, "type": "return"}
+
+    statuses, elapsed = _run_threads(app_module, auth_headers, body)
+
+    attempts = THREADS * ATTEMPTS_PER_THREAD
+    print(f"\n[{app_module.engine.dialect.name}] {attempts} returns: {attempts / elapsed:.0f} req/s")
+    assert statuses[200] == attempts
+    assert _units(app_module) == attempts
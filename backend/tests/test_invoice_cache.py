@@ -0,0 +1,36 @@
+"""Reprinted invoices come from the cache only while their transactions are unchanged."""
+from datetime import datetime
+
+
+def _daily(client, headers):
+    response = client.post("/api/invoices/daily?customer=02&date=2024-02-29", headers=headers)
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def test_changed_count_below_the_newest_id_invalidates_the_pdf(app_module, client, auth_headers):
+    with app_module.SessionLocal.session_factory() as s:
+        customer_id = s.query(app_module.Customer.id).filter_by(number="02").scalar()
+        rows = [
+            app_module.Transaction(
+                customer_id=customer_id, product_key="hardcups", amount=amount, tx_type="issue",
+                created_at=datetime(2024, 2, 29, 12, amount),
+            )
+            for amount in (1, 2, 3)
+        ]
+        s.add_all(rows)
+        s.commit()
+        oldest_id = rows[0].id
+
+    first = _daily(client, auth_headers)
+    misses = app_module.invoice_cache.stats()["misses"]
+    assert _daily(client, auth_headers) == first
+    assert app_module.invoice_cache.stats()["misses"] == misses
+
+    # MAX(id) stays the same, only COUNT(*) changes.
+    with app_module.SessionLocal.session_factory() as s:
+        s.query(app_module.Transaction).filter_by(id=oldest_id).delete()
+        s.commit()
+
+    assert _daily(client, auth_headers) != first
+    assert app_module.invoice_cache.stats()["misses"] == misses + 1
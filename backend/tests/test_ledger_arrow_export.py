@@ -0,0 +1,56 @@
+"""Parquet ledger export: fetched batches are merged into full row groups."""
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _seed(app_module, count=120):
+    created_at = datetime.utcnow() - timedelta(hours=1)
+    with app_module.SessionLocal.session_factory() as s:
+        customer_id = s.query(app_module.Customer.id).filter_by(number="02").scalar()
+        s.add_all(
+            app_module.Transaction(
+                customer_id=customer_id, product_key="hardcups", amount=1, tx_type="return", created_at=created_at
+            )
+            for _ in range(count)
+        )
+        s.commit()
+
+
+def _parquet(client, headers):
+    response = client.get("/api/export/transactions.parquet?since_id=0", headers=headers)
+    assert response.status_code == 200
+    return pq.ParquetFile(io.BytesIO(response.get_data()))
+
+
+def test_parquet_row_groups_span_fetch_batches(app_module, client, auth_headers, monkeypatch):
+    import export_utils
+
+    monkeypatch.setattr(app_module, "EXPORT_SETTLE_SECONDS", 0)
+    monkeypatch.setattr(export_utils, "EXPORT_BATCH_SIZE", 7)
+    monkeypatch.setattr(export_utils, "PARQUET_ROW_GROUP_SIZE", 50)
+    _seed(app_module)
+
+    metadata = _parquet(client, auth_headers).metadata
+    rows = metadata.num_rows
+    assert rows >= 120
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    assert sum(sizes) == rows
+    assert all(size == 50 for size in sizes[:-1])
+    assert 0 < sizes[-1] <= 50
+
+
+def test_arrow_stream_keeps_one_batch_per_fetch(app_module, client, auth_headers, monkeypatch):
+    import export_utils
+
+    monkeypatch.setattr(app_module, "EXPORT_SETTLE_SECONDS", 0)
+    monkeypatch.setattr(export_utils, "EXPORT_BATCH_SIZE", 7)
+    _seed(app_module, 20)
+    response = client.get("/api/export/transactions.arrow?since_id=0", headers=auth_headers)
+    assert response.status_code == 200
+    batches = list(pa.ipc.open_stream(response.get_data()))
+    assert batches and all(batch.num_rows <= 7 for batch in batches)
@@ -0,0 +1,54 @@
+"""Incremental ledger exports (since_id + X-Export-Last-Id)."""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+
+def _add_transaction(app_module, created_at):
+    with app_module.SessionLocal.session_factory() as s:
+        customer_id = s.query(app_module.Customer.id).filter_by(number="02").scalar()
+        tx = app_module.Transaction(
+            customer_id=customer_id, product_key="cocktail", amount=1, tx_type="return", created_at=created_at
+        )
+        s.add(tx)
+        s.commit()
+        return tx.id
+
+
+def _export(client, headers, since_id):
+    response = client.get(f"/api/export/transactions.csv?since_id={since_id}", headers=headers)
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))[1:]
+    return int(response.headers["X-Export-Last-Id"]), rows
+
+
+def test_rows_still_settling_are_left_for_the_next_sync(app_module, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(app_module, "EXPORT_SETTLE_SECONDS", 60)
+    now = datetime.utcnow()
+    settled = _add_transaction(app_module, now - timedelta(minutes=5))
+    fresh = _add_transaction(app_module, now)
+
+    last_id, rows = _export(client, auth_headers, settled - 1)
+    assert last_id == settled
+    assert len(rows) == 1
+
+    # Nothing new has settled: the mark does not move and nothing is exported.
+    assert _export(client, auth_headers, last_id) == (settled, [])
+
+    monkeypatch.setattr(app_module, "EXPORT_SETTLE_SECONDS", 0)
+    last_id, rows = _export(client, auth_headers, last_id)
+    assert last_id == fresh
+    assert len(rows) == 1
+
+
+def test_full_export_includes_rows_that_are_still_settling(app_module, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(app_module, "EXPORT_SETTLE_SECONDS", 60)
+    fresh = _add_transaction(app_module, datetime.utcnow())
+
+    response = client.get("/api/export/transactions.ndjson", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert int(response.headers["X-Export-Last-Id"]) == fresh
+    ids = [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()]
+    assert fresh in ids
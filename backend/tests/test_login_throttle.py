@@ -0,0 +1,42 @@
+"""Login throttling: a locked-out address must not lock the account out elsewhere."""
+import pytest
+
+from conftest import ADMIN_PASSWORD, ADMIN_USERNAME
+
+
+@pytest.fixture(autouse=True)
+def fresh_throttle(app_module):
+    app_module.login_throttle._failures.clear()
+    yield
+    app_module.login_throttle._failures.clear()
+
+
+def _login(client, ip, password):
+    return client.post(
+        "/api/auth/login",
+        json={"username": ADMIN_USERNAME, "password": password},
+        environ_base={"REMOTE_ADDR": ip},
+    )
+
+
+def test_locked_by_ip_a_correct_login_from_ip_b_still_works(app_module, client):
+    for _ in range(app_module.login_throttle.max_per_user):
+        assert _login(client, "6.6.6.6", "geraden").status_code == 401
+
+    locked = _login(client, "6.6.6.6", ADMIN_PASSWORD)
+    assert locked.status_code == 429
+    assert int(locked.headers["Retry-After"]) > 0
+
+    assert _login(client, "10.0.0.5", ADMIN_PASSWORD).status_code == 200
+
+
+def test_success_clears_only_its_own_address(app_module, client):
+    for _ in range(app_module.login_throttle.max_per_user - 1):
+        assert _login(client, "6.6.6.6", "geraden").status_code == 401
+        assert _login(client, "10.0.0.5", "typfout").status_code == 401
+
+    assert _login(client, "10.0.0.5", ADMIN_PASSWORD).status_code == 200
+    assert _login(client, "10.0.0.5", "typfout").status_code == 401
+
+    assert _login(client, "6.6.6.6", "geraden").status_code == 401
+    assert _login(client, "6.6.6.6", ADMIN_PASSWORD).status_code == 429
@@ -0,0 +1,54 @@
+"""Bridge scans under concurrent long-polling tills: each scan is delivered
+exactly once, and only to a till reading the scan's own source."""
+import threading
+import uuid
+from collections import Counter
+
+CONSUMERS = 8
+PUSHES = 200
+
+
+def test_concurrent_consumers_get_every_scan_exactly_once(
+    app_module, client, auth_headers, bridge_headers, monkeypatch
+):
+    monkeypatch.setattr(app_module, "NFC_READ_MAX_WAITERS", CONSUMERS)
+    run = uuid.uuid4().hex[:8]
+    sources = [f"kassa-{run}-a", f"kassa-{run}-b"]
+    delivered = Counter()
+    misrouted = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def consumer(source):
+        till = app_module.app.test_client()
+        while not done.is_set():
+            response = till.get(f"/api/nfc/read?wait=0.5&source={source}", headers=auth_headers)
+            if response.status_code != 200:
+                continue
+            code = response.get_json()["nfc_code"]
+            with lock:
+                delivered[code] += 1
+                if not code.startswith(source + "/"):
+                    misrouted.append((source, code))
+                if sum(delivered.values()) >= PUSHES:
+                    done.set()
+
+    threads = [threading.Thread(target=consumer, args=(sources[i % 2],)) for i in range(CONSUMERS)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(PUSHES):
+            source = sources[i % 2]
+            response = client.post(
+                "/api/nfc/push", json={"nfc_code": f"{source}/{i}", "source": source}, headers=bridge_headers
+            )
+            assert response.status_code in (200, 201), response.get_json()
+        done.wait(timeout=30)
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()  # reads still in flight are counted too
+
+    assert misrouted == []
+    assert set(delivered) == {f"{sources[i % 2]}/{i}" for i in range(PUSHES)}
+    assert max(delivered.values()) == 1
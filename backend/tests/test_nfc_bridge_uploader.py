@@ -0,0 +1,96 @@
+"""nfc_bridge.Uploader against a stub server: refused batches lose no valid scans."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import nfc_bridge
+
+SERVER_BATCH_MAX = 4
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.stored = []
+        self.batch_sizes = []
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """/api/nfc/push/batch with the checks of the real endpoint."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        scans = body.get("scans") or []
+        self.server.batch_sizes.append(len(scans))
+        if self.path != "/api/nfc/push/batch":
+            return self._reply(404, {"error": "Not found"})
+        if len(scans) > SERVER_BATCH_MAX:
+            return self._reply(400, {"error": f"Maximaal {SERVER_BATCH_MAX} scans per batch"})
+        if any(not scan.get("nfc_code") for scan in scans):
+            return self._reply(400, {"error": "nfc_code ontbreekt"})
+        self.server.stored.extend(scan["nfc_code"] for scan in scans)
+        self._reply(201, {"status": "stored"})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = _StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _drain(queue, stub_server, codes, batch_size):
+    for code in codes:
+        queue.put(code, "kassa-1")
+    uploader = nfc_bridge.Uploader(
+        queue, f"http://127.0.0.1:{stub_server.server_port}/api", "token", batch_size=batch_size
+    )
+    uploader.start()
+    uploader.notify()
+    deadline = time.monotonic() + 10
+    while len(queue) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    uploader.stop()
+    uploader.join(timeout=5)
+    return uploader
+
+
+def test_batch_above_the_server_limit_is_split_not_dropped(tmp_path, stub_server):
+    queue = nfc_bridge.ScanQueue(str(tmp_path / "queue.db"))
+    codes = [f"TAG{i:02d}" for i in range(10)]
+
+    uploader = _drain(queue, stub_server, codes, batch_size=10)
+
+    assert len(queue) == 0
+    assert stub_server.stored == codes
+    assert uploader.batch_size <= SERVER_BATCH_MAX
+
+
+def test_only_the_rejected_scan_is_dropped(tmp_path, stub_server):
+    queue = nfc_bridge.ScanQueue(str(tmp_path / "queue.db"))
+    codes = ["TAG1", "TAG2", "", "TAG4"]
+
+    uploader = _drain(queue, stub_server, codes, batch_size=4)
+
+    assert len(queue) == 0
+    assert stub_server.stored == ["TAG1", "TAG2", "TAG4"]
+    assert uploader.batch_size == 4  # a bad scan is no reason to send smaller batches
@@ -0,0 +1,81 @@
+"""Long-polling NFC reads with several server processes."""
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+
+def _push_from_other_worker(app_module, source):
+    """Insert a scan without waking this process, as a push to another worker would."""
+    with app_module.SessionLocal.session_factory() as s:
+        s.add(app_module.NfcScan(nfc_code=f"{source}/tag", source=source))
+        s.commit()
+
+
+def _read_in_thread(app_module, headers, source, wait, results):
+    def read():
+        started = time.monotonic()
+        response = app_module.app.test_client().get(f"/api/nfc/read?wait={wait}&source={source}", headers=headers)
+        results.append((response.status_code, response.get_json(), time.monotonic() - started))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    return thread
+
+
+def test_scan_pushed_to_another_worker_wakes_the_read(app_module, auth_headers, monkeypatch):
+    monkeypatch.setattr(app_module, "NFC_READ_RECHECK_SECONDS", 0.2)
+    source = f"kassa-{uuid.uuid4().hex[:8]}"
+    results = []
+    thread = _read_in_thread(app_module, auth_headers, source, 5, results)
+    time.sleep(0.3)
+
+    _push_from_other_worker(app_module, source)
+    thread.join()
+
+    status, body, elapsed = results[0]
+    assert status == 200
+    assert body["nfc_code"] == f"{source}/tag"
+    assert elapsed < 2
+
+
+def test_waiting_tills_share_one_watcher_query(app_module, auth_headers, monkeypatch):
+    monkeypatch.setattr(app_module, "NFC_READ_RECHECK_SECONDS", 0.2)
+    tills = 4
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "nfc_scans" in statement:
+            statements.append(statement)
+
+    results = []
+    threads = [
+        _read_in_thread(app_module, auth_headers, f"kassa-{uuid.uuid4().hex[:8]}", 1.5, results)
+        for _ in range(tills)
+    ]
+    time.sleep(0.3)  # every till has done its entry check
+    event.listen(app_module.engine, "before_cursor_execute", record)
+    time.sleep(0.8)
+    event.remove(app_module.engine, "before_cursor_execute", record)
+    for thread in threads:
+        thread.join()
+
+    assert all(status == 404 for status, _, _ in results)
+    # Only the watcher polls: about one query per 0.2 s, not one per till.
+    assert all("max(" in statement.lower() for statement in statements)
+    assert len(statements) <= 6
+
+
+def test_reads_beyond_the_waiter_limit_are_refused(app_module, auth_headers, monkeypatch):
+    monkeypatch.setattr(app_module, "NFC_READ_MAX_WAITERS", 1)
+    results = []
+    thread = _read_in_thread(app_module, auth_headers, f"kassa-{uuid.uuid4().hex[:8]}", 1, results)
+    time.sleep(0.2)
+
+    response = app_module.app.test_client().get("/api/nfc/read?wait=1&source=elders", headers=auth_headers)
+    thread.join()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert results[0][0] == 404
@@ -0,0 +1,108 @@
+"""USB reader manager with a fake backend, and no simulated codes with several workers."""
+import queue
+import time
+
+import pytest
+
+from nfc_reader import ReaderManager
+
+
+class FakeReader:
+    """Stands in for nfcpy: hands out queued tags; an exception means unplugged."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.plugged = True
+        self.opened = 0
+
+    def open(self):
+        if not self.plugged:
+            raise OSError("geen lezer")
+        self.opened += 1
+        return self
+
+    def read(self, terminate):
+        try:
+            event = self.events.get(timeout=0.02)
+        except queue.Empty:
+            return None
+        if isinstance(event, Exception):
+            raise event
+        return event
+
+    def close(self):
+        pass
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def reader():
+    fake = FakeReader()
+    manager = ReaderManager(open_backend=fake.open, reprobe_seconds=0.05, debounce_seconds=0.5)
+    manager.start()
+    yield fake, manager
+    manager.stop()
+
+
+def test_tags_are_delivered_in_order(reader):
+    fake, manager = reader
+    assert manager.available
+    fake.events.put("TAG-1")
+    fake.events.put("TAG-2")
+    assert manager.read(timeout=1) == "TAG-1"
+    assert manager.read(timeout=1) == "TAG-2"
+    assert manager.read(timeout=0) is None
+
+
+def test_a_tag_held_against_the_reader_counts_once(reader):
+    fake, manager = reader
+    for _ in range(3):
+        fake.events.put("TAG-1")
+    fake.events.put("TAG-2")
+    assert manager.read(timeout=1) == "TAG-1"
+    assert manager.read(timeout=1) == "TAG-2"
+    assert manager.read(timeout=0.1) is None
+
+    time.sleep(0.6)  # taken away for longer than debounce_seconds
+    fake.events.put("TAG-1")
+    assert manager.read(timeout=1) == "TAG-1"
+
+
+def test_reader_is_found_again_after_unplugging(reader):
+    fake, manager = reader
+    fake.plugged = False
+    fake.events.put(OSError("USB weg"))
+    _wait_until(lambda: not manager.available)
+    assert manager.last_error
+    assert manager.read(timeout=0.2) is None
+
+    fake.plugged = True
+    _wait_until(lambda: manager.available)
+    assert fake.opened == 2
+    fake.events.put("TAG-3")
+    assert manager.read(timeout=1) == "TAG-3"
+
+
+def test_several_workers_never_hand_out_simulated_codes(app_module, client, auth_headers, monkeypatch):
+    fake = FakeReader()
+    fake.plugged = False  # the reader is held by another worker
+    monkeypatch.setattr(app_module, "nfc_reader_manager", ReaderManager(open_backend=fake.open))
+    monkeypatch.setattr(app_module, "NFC_MODE", "auto")
+    monkeypatch.setattr(app_module, "NFC_BRIDGE_TOKEN", None)
+
+    monkeypatch.setattr(app_module, "NFC_SIMULATION", False)
+    response = client.get("/api/nfc/read", headers=auth_headers)
+    assert response.status_code == 503
+    assert "Retry-After" not in response.headers
+
+    monkeypatch.setattr(app_module, "NFC_SIMULATION", True)
+    response = client.get("/api/nfc/read", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()["mode"] == "simulation"
+    app_module.nfc_reader_manager.stop()
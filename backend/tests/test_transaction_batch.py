@@ -0,0 +1,35 @@
+"""POST /api/transactions/batch applies its lines in order."""
+
+
+def _set_stock(client, headers, product, units):
+    response = client.put(f"/api/inventory/{product}", json={"units": units}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+
+
+def _batch(client, headers, *lines):
+    return client.post(
+        "/api/transactions/batch",
+        json={"identifier": "02", "lines": [{"product": "cocktail", "amount": a, "type": t} for t, a in lines]},
+        headers=headers,
+    )
+
+
+def test_issue_is_not_covered_by_a_later_return(client, auth_headers):
+    _set_stock(client, auth_headers, "cocktail", 500)
+
+    response = _batch(client, auth_headers, ("issue", 600), ("return", 600))
+
+    assert response.status_code == 400
+    assert response.get_json()["results"] == [{"line": 0, "error": "Not enough inventory"}]
+    assert client.get("/api/inventory", headers=auth_headers).get_json()["cocktail"]["units"] == 500
+
+
+def test_earlier_return_covers_an_issue_and_lines_report_running_stock(client, auth_headers):
+    _set_stock(client, auth_headers, "cocktail", 500)
+
+    response = _batch(client, auth_headers, ("return", 200), ("issue", 600), ("return", 50))
+
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert [line["new_units"] for line in body["results"]] == [700, 100, 150]
+    assert body["inventory"]["cocktail"] == 150
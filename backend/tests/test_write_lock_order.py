@@ -0,0 +1,103 @@
+"""Writers lock their own rows before data_versions; till writes bump it after their commit."""
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+
+@contextmanager
+def _statements(engine):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ("INSERT", "UPDATE", "DELETE"):
+            seen.append(statement)
+
+    def commit(conn):
+        seen.append("COMMIT")
+
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(engine, "commit", commit)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        event.remove(engine, "commit", commit)
+
+
+def _tables(statements):
+    tables = []
+    for statement in statements:
+        if statement == "COMMIT":
+            tables.append(statement)
+            continue
+        words = statement.replace("`", "").replace('"', "").split()
+        target = words[2] if words[0].upper() in ("INSERT", "DELETE") else words[1]
+        tables.append(target)
+    return tables
+
+
+def _unique_number():
+    return f"{uuid.uuid4().int % 10**8:08d}"
+
+
+@pytest.mark.parametrize(
+    "method, url, body, table",
+    [
+        ("put", "/api/inventory/champagne", {"units": 40}, "inventory"),
+        ("put", "/api/customers/{customer_id}", {"name": "Hernoemd"}, "customers"),
+        ("put", "/api/users/{user_id}", {"role": "admin"}, "users"),
+        ("post", "/api/customers", {"number": "{number}", "name": "Nieuw"}, "customers"),
+    ],
+)
+def test_data_versions_are_written_last(app_module, client, auth_headers, method, url, body, table):
+    # Throwaway rows and numbers, so the seeded admin and customers stay as
+    # they were and the suite can run again against the same database.
+    with app_module.SessionLocal.session_factory() as s:
+        user = app_module.User(username=f"tmp-{uuid.uuid4().hex[:8]}", password_hash="-", role="medewerker")
+        customer = app_module.Customer(number=_unique_number(), name="Tijdelijk")
+        s.add_all([user, customer])
+        s.commit()
+        ids = {"customer_id": customer.id, "user_id": user.id}
+    body = {key: _unique_number() if value == "{number}" else value for key, value in body.items()}
+
+    with _statements(app_module.engine) as statements:
+        response = getattr(client, method)(url.format(**ids), json=body, headers=auth_headers)
+    assert response.status_code in (200, 201), response.get_json()
+
+    tables = _tables(statements)
+    assert tables[0] == table
+    assert tables[-2:] == ["data_versions", "COMMIT"]
+
+
+@pytest.mark.parametrize(
+    "url, body, table, scope",
+    [
+        ("/api/transaction", {"identifier": "02", "product": "hardcups", "amount": 1, "type": "return"}, "inventory", "inventory"),
+        ("/api/coins/intake", {"identifier": "02", "amount": 1}, "coin_transactions", "totals"),
+    ],
+)
+def test_till_writes_bump_versions_after_their_commit(app_module, client, auth_headers, url, body, table, scope):
+    with app_module.SessionLocal.session_factory() as s:
+        before = app_module.current_data_version(s, scope)
+
+    with _statements(app_module.engine) as statements:
+        response = client.post(url, json=body, headers=auth_headers)
+    assert response.status_code == 200, response.get_json()
+
+    tables = _tables(statements)
+    booking = tables[: tables.index("COMMIT") + 1]
+    assert table in booking
+    assert "data_versions" not in booking
+    bump = tables[len(booking):]
+    assert set(bump[:-1]) == {"data_versions"} and bump[-1] == "COMMIT"
+    with app_module.SessionLocal.session_factory() as s:
+        assert app_module.current_data_version(s, scope) == before + 1
+
+
+def test_duplicate_customer_number_is_still_refused(client, auth_headers):
+    response = client.post("/api/customers", json={"number": "02", "name": "Dubbel"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Klantnummer of NFC bestaat al"
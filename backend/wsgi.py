@@ -0,0 +1,21 @@
+"""WSGI entry point for production servers.
+
+Linux/macOS:  gunicorn -c gunicorn.conf.py wsgi:app
+Windows:      python wsgi.py   (waitress, WEB_THREADS threads)
+"""
+import os
+
+from app import create_app, warm_up
+
+app = application = create_app()
+
+if __name__ == "__main__":
+    from waitress import serve
+
+    warm_up()
+    serve(
+        app,
+        host=os.getenv("BACKEND_HOST", "0.0.0.0"),
+        port=int(os.getenv("BACKEND_PORT", "5000")),
+        threads=int(os.getenv("WEB_THREADS", "8")),
+    )
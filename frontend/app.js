@@ -23,6 +23,7 @@ let CURRENT_CUSTOMER = null;
 const SETTINGS_STORAGE_KEY = "hardcupsSettings";
 const DEFAULT_SETTINGS = {
   apiBase: "/api",
+  nfcSource: "",
 };
 let SETTINGS = { ...DEFAULT_SETTINGS };
 
@@ -68,6 +69,10 @@ function applySettings() {
   if (apiInput) {
     apiInput.value = API;
   }
+  const sourceInput = document.getElementById("nfcSource");
+  if (sourceInput) {
+    sourceInput.value = SETTINGS.nfcSource || "";
+  }
 }
 
 function resetSettingsToDefault() {
@@ -88,10 +93,13 @@ function handleSettingsSubmit(event) {
   if (!value) {
     return alert("Vul een API-adres in.");
   }
+  const sourceInput = document.getElementById("nfcSource");
+  SETTINGS.nfcSource = sourceInput ? sourceInput.value.trim() : "";
+  const apiChanged = value.replace(/\/+$/, "") !== API;
   SETTINGS.apiBase = value;
   applySettings();
   persistSettings();
-  if (TOKEN) {
+  if (TOKEN && apiChanged) {
     alert("API-adres bijgewerkt. Log opnieuw in om de wijziging toe te passen.");
     logout();
   } else {
@@ -692,7 +700,18 @@ async function saveKlant(id) {
 
 async function scanNFCInto(inputId, pillId, callback) {
   try {
-    const res = await fetch(`${API}/nfc/read`, { headers: authHeaders() });
+    // Long-poll: in bridge mode the server answers as soon as a scan arrives.
+    const params = new URLSearchParams({ wait: "20" });
+    if (SETTINGS.nfcSource) params.set("source", SETTINGS.nfcSource);
+    const giveUpAt = Date.now() + 20000;
+    let res = await fetch(`${API}/nfc/read?${params}`, { headers: authHeaders() });
+    // 503 + Retry-After: too many tills are already waiting on this server;
+    // try again shortly. A 503 without it (no reader) is final.
+    while (res.status === 503 && res.headers.get("Retry-After") && Date.now() < giveUpAt) {
+      const retryAfter = Number(res.headers.get("Retry-After")) || 1;
+      await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+      res = await fetch(`${API}/nfc/read?${params}`, { headers: authHeaders() });
+    }
     const data = await res.json();
     if (res.ok && data.nfc_code) {
       document.getElementById(inputId).value = data.nfc_code;
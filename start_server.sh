@@ -71,9 +71,17 @@ cleanup() {
 trap cleanup EXIT
 
 cd "$PROJECT_ROOT/backend"
-python app.py &
-BACK_PID=$!
-echo "[backend] Flask API gestart op http://$BACKEND_HOST:$BACKEND_PORT (PID $BACK_PID)"
+if [ "${FLASK_DEBUG:-0}" = "1" ] || ! command -v gunicorn >/dev/null 2>&1; then
+    python app.py &
+    BACK_PID=$!
+    echo "[backend] Flask-ontwikkelserver gestart op http://$BACKEND_HOST:$BACKEND_PORT (PID $BACK_PID)"
+else
+    # Schema en startgegevens één keer bijwerken, niet in elke worker.
+    python app.py bootstrap
+    AUTO_BOOTSTRAP=0 gunicorn -c gunicorn.conf.py wsgi:app &
+    BACK_PID=$!
+    echo "[backend] Flask API (gunicorn, ${WEB_WORKERS:-2} workers x ${WEB_THREADS:-8} threads) gestart op http://$BACKEND_HOST:$BACKEND_PORT (PID $BACK_PID)"
+fi
 
 if [ "$START_FRONTEND" = "1" ]; then
     cd "$PROJECT_ROOT/frontend"